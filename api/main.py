@@ -1,30 +1,51 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import sys
 import os
+import math
 import random
-import time
 import asyncio
 import uvicorn
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 from datetime import datetime
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from fastapi import FastAPI, HTTPException, Query, WebSocket, BackgroundTasks, UploadFile, File, Response, WebSocketDisconnect, Depends, status
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from services.service import Service
 from repository.repository import Repository
 from data.domain.article import Article, Coordinates
-from datalink.db_connection import SessionLocal
+from datalink.db_connection import SessionLocal, engine, replica_engines, session_router
 from datalink.models import User
+from datalink.instrumentation import QueryInstrumentation, SlowQueryLog
+from services.metrics_service import MetricsService
+from services.profiling_service import ProfilingService
+from services.enrichment_worker import EnrichmentWorker
+from services.admission_control import AdmissionController, TokenBucketLimiter
+from services.export_service import EXTENSIONS, MEDIA_TYPES, parse_columns
+from api.middleware import AdmissionControlMiddleware, ConsistencyMiddleware, MetricsMiddleware, ProfilingMiddleware
 
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+WARMUP_MODEL = os.environ.get("WARMUP_MODEL", "0") == "1"
+# /debug/* exposes SQL and stack traces; it is off unless explicitly enabled and then needs a login.
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "0") == "1"
+CHANGES_PAGE_SIZE = 500
+ENRICHMENT_WORKERS = int(os.environ.get("ENRICHMENT_WORKERS", "1"))
+EMBEDDING_SNAPSHOT_PATH = os.environ.get("EMBEDDING_SNAPSHOT_PATH", str(Path(project_root) / "snapshots" / "embeddings"))
+startup_report: Dict[str, Any] = {"import_seconds": IMPORT_SECONDS}
+
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM")
 # SECRET_KEY = "secret"
@@ -52,6 +73,8 @@ class TokenData(BaseModel):
     username: str = None
 
 app = FastAPI()
+admission_controller = AdmissionController.from_env()
+user_rate_limiter = TokenBucketLimiter.from_env()
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -87,6 +110,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
+
+    retry_after = user_rate_limiter.acquire(token_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
     
     with SessionLocal() as db:
         user = db.query(User).filter(User.username == token_data.username).first()
@@ -101,8 +132,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[ConsistencyMiddleware.HEADER, "X-Change-Version"],
 )
 
+metrics_service = MetricsService()
+query_instrumentation = QueryInstrumentation()
+query_instrumentation.add_listener(lambda statement, parameters, duration: metrics_service.observe_query(duration))
+slow_query_log = SlowQueryLog(threshold=float(os.environ.get("SLOW_QUERY_MS", "200")) / 1000)
+query_instrumentation.add_listener(slow_query_log)
+query_instrumentation.attach(engine)
+for replica_engine in replica_engines:
+    query_instrumentation.attach(replica_engine)
+
+profiling_service = ProfilingService.from_env(Path(project_root) / "profiles")
+
+if profiling_service.enabled:
+    app.add_middleware(ProfilingMiddleware, profiling=profiling_service)
+app.add_middleware(ConsistencyMiddleware, router=session_router)
+app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
+app.add_middleware(MetricsMiddleware, metrics=metrics_service)
+
 UPLOAD_DIR = Path(project_root) / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
@@ -142,8 +191,58 @@ class ArticleInput(BaseModel):
     year: int
     abstract: str
 
+class ArticleUpdateInput(ArticleInput):
+    id: int
+
+MAX_BATCH_SIZE = 1000
+MAP_REBUILD_BATCH_SIZE = 200
+
+class ArticleBatchInput(BaseModel):
+    creates: List[ArticleInput] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    updates: List[ArticleUpdateInput] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    deletes: List[int] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
 repository = Repository()
 service = Service(repository)
+enrichment_worker = EnrichmentWorker(repository, service.abstracts_encoder, workers=ENRICHMENT_WORKERS)
+
+def run_in_background(task, *args):
+    try:
+        task(*args)
+    except Exception as e:
+        print(f"Background task {task.__name__} failed: {e}")
+
+@app.on_event("startup")
+async def build_in_memory_indexes():
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, run_in_background, service.rebuild_map_tiles)
+    loop.run_in_executor(None, run_in_background, service.rebuild_suggestions)
+
+    def on_articles_enriched(articles):
+        service.on_articles_enriched(articles)
+        for article in articles:
+            asyncio.run_coroutine_threadsafe(
+                broadcast_message({"type": "article_enriched", "data": article.dict()}),
+                loop
+            )
+
+    enrichment_worker.on_enriched = on_articles_enriched
+    if ENRICHMENT_WORKERS > 0:
+        enrichment_worker.start()
+
+    # Memory-mapped, so opening it is cheap and every worker process shares the same pages.
+    run_in_background(service.use_embedding_snapshot, EMBEDDING_SNAPSHOT_PATH)
+
+    # The encoder model is loaded lazily; warming it up is opt-in and never delays serving.
+    if WARMUP_MODEL:
+        loop.run_in_executor(None, run_in_background, service.abstracts_encoder.warm_up)
+
+    startup_report["startup_seconds"] = time.perf_counter() - IMPORT_STARTED
+    print(
+        f"Startup: imports {startup_report['import_seconds']:.2f}s, "
+        f"ready to serve after {startup_report['startup_seconds']:.2f}s, "
+        f"model warm-up {'in background' if WARMUP_MODEL else 'disabled'}"
+    )
 
 @app.post("/upload/")
 async def upload_file(file: UploadFile = File(...)):
@@ -218,7 +317,9 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             data = await websocket.receive_text()
             
-            if data == "start_generation":
+            if data.startswith("sync:"):
+                await replay_changes(websocket, data[len("sync:"):])
+            elif data == "start_generation":
                 asyncio.create_task(generate_articles_async(websocket))
             elif data == "stop_generation":
                 await websocket.send_json({"type": "status", "data": {"message": "Generation stopped"}})
@@ -228,6 +329,17 @@ async def websocket_endpoint(websocket: WebSocket):
         if websocket in active_connections:
             active_connections.remove(websocket)
 
+async def replay_changes(websocket: WebSocket, since: str):
+    """Send every change after `since` as "changes" pages, so a reconnecting client only catches up on deltas"""
+    if not since.isdigit():
+        await websocket.send_json({"type": "status", "data": {"message": f"Invalid sync version: {since}"}})
+        return
+
+    page = {"next_since": int(since), "has_more": True}
+    while page["has_more"]:
+        page = await run_in_threadpool(service.get_changes, page["next_since"], CHANGES_PAGE_SIZE)
+        await websocket.send_json({"type": "changes", "data": jsonable_encoder(page)})
+
 async def generate_articles_async(websocket: WebSocket):
     """Generate random articles asynchronously and send updates via WebSocket"""
     try:
@@ -275,6 +387,75 @@ def health_check():
     """Simple health check endpoint"""
     return {"status": "ok"}
 
+metrics_service.describe("http_requests_total", "counter", "HTTP requests by method, route template and status code.")
+metrics_service.describe("http_request_duration_seconds", "histogram", "Time until the last response byte was sent.")
+metrics_service.describe("http_request_db_queries", "histogram", "SQL statements executed per HTTP request.")
+metrics_service.describe("http_request_db_duration_seconds", "histogram", "Time spent in SQL statements per HTTP request.")
+metrics_service.describe("db_queries_total", "counter", "SQL statements executed on the primary and replica engines.")
+metrics_service.describe("db_query_duration_seconds_total", "counter", "Total time spent executing SQL statements.")
+metrics_service.describe("websocket_connections", "gauge", "Currently open /ws connections.")
+metrics_service.describe("db_pool_checked_out", "gauge", "Connections currently checked out of the pool.")
+metrics_service.describe("db_pool_size", "gauge", "Configured size of the connection pool.")
+metrics_service.describe("db_pool_overflow", "gauge", "Connections open beyond the configured pool size.")
+metrics_service.describe("db_replica_reads_total", "counter", "Reads served by a read replica.")
+metrics_service.describe("db_primary_read_fallbacks_total", "counter", "Reads sent to the primary because no replica had caught up.")
+
+metrics_service.describe("search_cache_hits_total", "counter", "Searches answered from the result cache.")
+metrics_service.describe("search_cache_misses_total", "counter", "Searches that had to scan the articles table.")
+metrics_service.describe("search_cache_entries", "gauge", "Queries currently held in the search result cache.")
+metrics_service.describe("search_cache_bytes", "gauge", "Approximate memory held by the search result cache.")
+
+metrics_service.describe("app_import_seconds", "gauge", "Time spent importing the application modules.")
+metrics_service.describe("app_startup_seconds", "gauge", "Time from the first import until the server accepted requests.")
+metrics_service.describe("encoder_model_loaded", "gauge", "1 once the sentence embedding model is in memory.")
+metrics_service.describe("encoder_warmup_seconds", "gauge", "Time taken by the background model warm-up.")
+
+metrics_service.register_gauge("app_import_seconds", lambda: startup_report["import_seconds"])
+metrics_service.register_gauge("app_startup_seconds", lambda: startup_report["startup_seconds"])
+metrics_service.register_gauge("encoder_model_loaded", lambda: int(service.abstracts_encoder.loaded))
+metrics_service.register_gauge("encoder_warmup_seconds", lambda: service.abstracts_encoder.warmup_seconds)
+metrics_service.register_gauge("websocket_connections", lambda: len(active_connections))
+metrics_service.register_gauge("search_cache_hits_total", lambda: service.search_cache.hits)
+metrics_service.register_gauge("search_cache_misses_total", lambda: service.search_cache.misses)
+metrics_service.register_gauge("search_cache_entries", lambda: service.search_cache.stats()["entries"])
+metrics_service.register_gauge("search_cache_bytes", lambda: service.search_cache.bytes)
+metrics_service.register_gauge("db_pool_checked_out", lambda: engine.pool.checkedout())
+metrics_service.register_gauge("db_pool_size", lambda: engine.pool.size())
+metrics_service.register_gauge("db_pool_overflow", lambda: max(engine.pool.overflow(), 0))
+metrics_service.describe("admission_in_flight", "gauge", "Requests currently running, per cost class.")
+metrics_service.describe("admission_queue_depth", "gauge", "Requests waiting for a slot, per cost class.")
+metrics_service.describe("admission_rejections_total", "counter", "Requests shed with 503, per cost class.")
+metrics_service.describe("user_rate_limited_total", "counter", "Authenticated requests rejected with 429 by the per-user rate limit.")
+for cost_class in admission_controller.classes.values():
+    metrics_service.register_gauge("admission_in_flight", lambda cost_class=cost_class: cost_class.active, cost_class=cost_class.name)
+    metrics_service.register_gauge("admission_queue_depth", lambda cost_class=cost_class: cost_class.queue_depth, cost_class=cost_class.name)
+    metrics_service.register_gauge("admission_rejections_total", lambda cost_class=cost_class: cost_class.rejections, cost_class=cost_class.name)
+metrics_service.register_gauge("user_rate_limited_total", lambda: user_rate_limiter.rejections)
+metrics_service.register_gauge("db_replica_reads_total", lambda: session_router.replica_reads)
+metrics_service.register_gauge("db_primary_read_fallbacks_total", lambda: session_router.primary_fallbacks)
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics_service.render(), media_type="text/plain; version=0.0.4")
+
+def debug_endpoints_enabled():
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/slow_queries", dependencies=[Depends(debug_endpoints_enabled), Depends(get_current_user)])
+def get_slow_queries(limit: int = Query(50, ge=1, le=200)):
+    """Most recent statements slower than SLOW_QUERY_MS, newest first"""
+    return {"threshold_ms": slow_query_log.threshold * 1000, "queries": slow_query_log.recent(limit)}
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(debug_endpoints_enabled), Depends(get_current_user)])
+def get_profile(profile_id: str):
+    """Folded stacks of a profiled request, ready for flamegraph.pl or speedscope"""
+    profile_path = profiling_service.get_profile_path(profile_id)
+    if not profile_path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(profile_path, media_type="text/plain", filename=profile_path.name)
+
 @app.post("/register", response_model=UserResponse)
 async def register_user(user: UserCreate):
     """Register a new user"""
@@ -324,8 +505,37 @@ async def read_users_me(current_user: UserResponse = Depends(get_current_user)):
     return current_user
 
 @app.get("/all_articles")
-def get_all():
-    return service.get_all_articles()
+def get_all(response: Response):
+    # Read before the articles on the same server, so resuming the change feed from it can only repeat changes, never miss one.
+    version, articles = service.get_all_articles_with_version()
+    response.headers["X-Change-Version"] = str(version)
+    return articles
+
+@app.get("/export")
+def export_articles(
+    format: str = Query("ndjson", pattern="^(parquet|arrow|ndjson)$"),
+    columns: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None
+):
+    """Stream the articles table as Parquet, an Arrow IPC stream or ndjson; `columns` is comma-separated"""
+    try:
+        stream = service.export_articles(format, parse_columns(columns), year_from, year_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError:
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow installed")
+
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="articles.{EXTENSIONS[format]}"'}
+    )
+
+@app.get("/changes")
+def get_changes(since: int = Query(0, ge=0), limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=5000)):
+    """Article changes after version `since`; follow `next_since` while `has_more`"""
+    return service.get_changes(since, limit)
 
 @app.get("/sorted_articles")
 def get_sorted_articles(sort_by: str = 'citations', order: str = 'desc'):
@@ -335,6 +545,25 @@ def get_sorted_articles(sort_by: str = 'citations', order: str = 'desc'):
 def get_articles_by_year(year: int):
     return service.get_articles_by_year(year)
 
+@app.get("/articles_in_bbox")
+def get_articles_in_bbox(xmin: float, xmax: float, ymin: float, ymax: float, limit: int = Query(500, ge=1, le=5000)):
+    try:
+        return service.get_articles_in_bbox(xmin, xmax, ymin, ymax, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/suggest")
+def suggest(prefix: str = Query(..., min_length=1), field: str = Query("title", pattern="^(title|author|journal)$"),
+            k: int = Query(10, ge=1, le=20)):
+    return service.suggest(prefix, field, k)
+
+@app.get("/map/tiles/{z}/{x}/{y}")
+def get_map_tile(z: int, x: int, y: int):
+    try:
+        return service.get_map_tile(z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/article/{index}")
 def get_article_by_index(index: int):
     try:
@@ -348,6 +577,53 @@ def get_article_by_index(index: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.on_event("shutdown")
+def stop_enrichment_worker():
+    enrichment_worker.stop(timeout=5)
+
+@app.get("/jobs/{job_id}")
+def get_enrichment_job(job_id: int):
+    """Status of an embedding/coordinate computation job"""
+    job = service.get_enrichment_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/jobs/{job_id}/retry")
+def retry_enrichment_job(job_id: int, current_user: UserResponse = Depends(get_current_user)):
+    """Requeue a job that exhausted its automatic retries"""
+    if not service.retry_enrichment_job(job_id):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} does not exist or has not failed")
+    return service.get_enrichment_job(job_id)
+
+@app.get("/article/{index}/enrichment")
+def get_article_enrichment(index: int):
+    """Most recent enrichment job of an article"""
+    job = service.get_article_enrichment(index)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"No enrichment job for article {index}")
+    return job
+
+@app.get("/article/{index}/related")
+def get_related_articles(index: int, k: int = Query(10, ge=1, le=20)):
+    return service.get_related_articles(index, k)
+
+@app.get("/stats/facets")
+def get_facets(query: Optional[str] = None, year: Optional[int] = None, top_journals: int = Query(10, ge=1, le=100)):
+    """Articles per year, top journals and a citation histogram, for all articles or those matching `query`/`year`"""
+    return service.get_facets(query, year, top_journals)
+
+@app.get("/article/{index}/similar")
+def get_similar_articles(index: int, k: int = Query(10, ge=1, le=100), rerank: bool = False):
+    """Nearest articles by embedding from the quantized snapshot; `rerank` rescores candidates in float32"""
+    try:
+        similar = service.get_similar_articles(index, k, rerank)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Article {index} has no embedding")
+    return similar
+
 @app.post("/add_article")
 def add_article(article_input: ArticleInput, background_tasks: BackgroundTasks, current_user: UserResponse = Depends(get_current_user)):
     try:
@@ -376,6 +652,7 @@ def add_article(article_input: ArticleInput, background_tasks: BackgroundTasks,
             broadcast_message, 
             {"type": "new_article", "data": saved_article.dict()}
         )
+        background_tasks.add_task(run_in_background, service.update_related_articles, [saved_article.index])
 
         return saved_article
         
@@ -432,6 +709,7 @@ def update_article(article_id: str, article_input: ArticleInput, background_task
                 broadcast_message, 
                 {"type": "article_updated", "data": updated_article.dict()}
             )
+            background_tasks.add_task(run_in_background, service.update_related_articles, [updated_article.index])
             
             return updated_article
         else:
@@ -442,7 +720,7 @@ def update_article(article_id: str, article_input: ArticleInput, background_task
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/articles/{article_id}")
-def delete_article(article_id: str, current_user: UserResponse = Depends(get_current_user)):
+def delete_article(article_id: str, background_tasks: BackgroundTasks, current_user: UserResponse = Depends(get_current_user)):
     try:
         all_articles = service.get_all_articles()
         found_article = None
@@ -471,6 +749,11 @@ def delete_article(article_id: str, current_user: UserResponse = Depends(get_cur
                 service.delete_article_by_index(int(article_id))
             else:
                 service.delete_article(article_id)
+
+            background_tasks.add_task(
+                broadcast_message,
+                {"type": "article_deleted", "data": {"index": found_article.index}}
+            )
                 
             return {"message": "Article deleted successfully"}
         else:
@@ -480,10 +763,68 @@ def delete_article(article_id: str, current_user: UserResponse = Depends(get_cur
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/articles/batch")
+def apply_article_batch(batch: ArticleBatchInput, background_tasks: BackgroundTasks, current_user: UserResponse = Depends(get_current_user)):
+    """Create, update and delete many articles in one transaction, with one result per item"""
+    user_id = int(current_user.id)
+    creates = [
+        Article(
+            authors=item.authors,
+            title=item.title,
+            journal=item.journal,
+            abstract=item.abstract,
+            year=item.year,
+            citations=item.citations,
+            coordinates=Coordinates(x=0.0, y=0.0),
+            user_id=user_id
+        )
+        for item in batch.creates
+    ]
+    updates = [
+        Article(
+            authors=item.authors,
+            title=item.title,
+            journal=item.journal,
+            abstract=item.abstract,
+            year=item.year,
+            citations=item.citations,
+            coordinates=Coordinates(x=0.0, y=0.0),
+            index=item.id,
+            id=str(item.id),
+            user_id=user_id
+        )
+        for item in batch.updates
+    ]
+
+    try:
+        results = service.apply_batch(creates, updates, batch.deletes, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    created = [result["article"].dict() for result in results["creates"] if result["status"] == "created"]
+    updated = [result["article"].dict() for result in results["updates"] if result["status"] == "updated"]
+    deleted = [result["id"] for result in results["deletes"] if result["status"] == "deleted"]
+
+    if created or updated or deleted:
+        background_tasks.add_task(
+            broadcast_message,
+            {"type": "articles_batch", "data": {"created": created, "updated": updated, "deleted": deleted}}
+        )
+
+    changed_indexes = [article["index"] for article in created + updated]
+    if changed_indexes:
+        background_tasks.add_task(run_in_background, service.update_related_articles, changed_indexes)
+
+    # Incremental updates keep the tiles correct; a large batch may also move the corpus bounds.
+    if len(created) + len(updated) + len(deleted) >= MAP_REBUILD_BATCH_SIZE:
+        background_tasks.add_task(run_in_background, service.rebuild_map_tiles)
+
+    return results
+
 @app.get("/search")
-def search_articles(query: str = Query(..., min_length=1)):
+def search_articles(query: str = Query(..., min_length=1), year: Optional[int] = None):
     try:
-        results = service.search_articles(query)
+        results = service.search_articles(query, year)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
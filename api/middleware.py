@@ -0,0 +1,170 @@
+import time
+from starlette.responses import JSONResponse
+from datalink.instrumentation import QueryStats, current_query_stats
+from datalink.routing import ConsistencyToken, SessionRouter, current_consistency, format_lsn, parse_lsn
+from services.admission_control import AdmissionController
+from services.metrics_service import MetricsService
+from services.profiling_service import ProfilingService
+
+
+def route_label(scope: dict) -> str:
+    """Route template (e.g. `/article/{index}`) so metric cardinality stays bounded.
+
+    Requests shed by admission control never reach the router and are
+    labelled with their cost class instead (`shed:heavy`).
+    """
+    route = scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    if "shed_cost_class" in scope:
+        return f"shed:{scope['shed_cost_class']}"
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: MetricsService):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        finished_at = None
+        status_code = 500
+        stats = QueryStats(scope["path"])
+        token = current_query_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status_code, finished_at
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished_at = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            duration = (finished_at or time.perf_counter()) - start
+            self.metrics.observe_request(
+                scope["method"],
+                route_label(scope),
+                status_code,
+                duration,
+                stats.count,
+                stats.duration
+            )
+
+
+class ProfilingMiddleware:
+    """Profiles selected requests up to the moment their response headers are sent.
+
+    By then the handler has run its queries, mapped rows and rendered the
+    body, so the profile covers DB I/O, mapping and serialization. The stored
+    profile id is returned in the `X-Profile-Id` response header.
+    """
+
+    def __init__(self, app, profiling: ProfilingService):
+        self.app = app
+        self.profiling = profiling
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiling.should_profile(scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self.profiling.start()
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            nonlocal profiler
+            if message["type"] == "http.response.start" and profiler is not None:
+                profile_id = self.profiling.finish(profiler, scope["method"], route_label(scope))
+                profiler = None
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                self.profiling.finish(profiler, scope["method"], route_label(scope))
+
+
+class ConsistencyMiddleware:
+    """Read-your-writes across requests when reads are served by replicas.
+
+    A response to a request that wrote carries the primary's WAL position
+    in `X-Consistency-Token`. A client that sends the token back has its
+    reads routed to replicas that have replayed at least that far, or to
+    the primary.
+    """
+    HEADER = "X-Consistency-Token"
+
+    def __init__(self, app, router: SessionRouter):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        header = self.HEADER.lower().encode()
+        sent = next((value.decode() for name, value in scope["headers"] if name == header), None)
+        consistency = ConsistencyToken(parse_lsn(sent))
+        token = current_consistency.set(consistency)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and consistency.written is not None:
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (header, format_lsn(consistency.minimum).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_consistency.reset(token)
+
+
+class AdmissionControlMiddleware:
+    """Limits concurrent requests per cost class and sheds the excess with `503` and `Retry-After`.
+
+    A request holds its slot until the last body chunk is sent, so streamed
+    responses count for as long as they run.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        cost_class = self.controller.classify(scope["path"], scope["method"]) if scope["type"] == "http" else None
+        if cost_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await cost_class.acquire():
+            scope["shed_cost_class"] = cost_class.name
+            response = JSONResponse(
+                {"detail": "Server is busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(cost_class.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            cost_class.release(time.perf_counter() - start)
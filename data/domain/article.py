@@ -16,6 +16,7 @@ class Article(BaseModel):
     index: int = None
     id: str = None
     user_id: int = None
+    enrichment_status: str = None
     
     def __init__(self, **data):
         if 'index' in data and data['index'] is not None:
@@ -1,17 +1,262 @@
+from datetime import timedelta
+from sqlalchemy import Integer, any_, bindparam, delete, func, insert, or_, and_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, array
 from sqlalchemy.orm import Session
 from . import models
 from data.domain import Article as DomainArticle, Coordinates
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Lower edges of the citation histogram buckets; the last bucket is open-ended.
+CITATION_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+# Key of the transaction-level advisory lock taken by change-log writers.
+CHANGE_LOG_LOCK = 7_318_032
+# Advisory lock over the kNN graph: shared by incremental merges, exclusive for a full rebuild.
+# Merges also lock each list they rewrite with the two-part key (NEIGHBORS_LOCK, article id).
+NEIGHBORS_LOCK = 7_318_034
+
+# Column order of the row tuples accepted by `_map_rows`.
+ARTICLE_COLUMNS = (
+    models.Article.article_id,
+    models.Article.user_id,
+    models.Article.title,
+    models.Article.content,
+    models.Article.abstract,
+    models.Article.year,
+    models.Article.citations,
+    models.Article.authors,
+    models.Article.journal,
+    models.Article.coordinate_x,
+    models.Article.coordinate_y,
+    models.Article.embeddings,
+    models.Article.enrichment_status,
+)
+
+# Columns that can be exported, by their name in exported files.
+EXPORT_COLUMNS = {
+    "index": models.Article.article_id,
+    "user_id": models.Article.user_id,
+    "title": models.Article.title,
+    "abstract": models.Article.abstract,
+    "year": models.Article.year,
+    "citations": models.Article.citations,
+    "authors": models.Article.authors,
+    "journal": models.Article.journal,
+    "coordinate_x": models.Article.coordinate_x,
+    "coordinate_y": models.Article.coordinate_y,
+    "embeddings": models.Article.embeddings,
+    "enrichment_status": models.Article.enrichment_status,
+}
 
 class DataLink:
     def get_articles(self, db: Session) -> List[DomainArticle]:
-        db_articles = db.query(models.Article).all()
-        return [self._map_to_domain_article(article) for article in db_articles]
+        rows = db.query(*ARTICLE_COLUMNS).all()
+        return self._map_rows(rows)
     
     def get_articles_by_year(self, db: Session, year: int) -> List[DomainArticle]:
-        db_articles = db.query(models.Article).filter(models.Article.year == year).all()
-        return [self._map_to_domain_article(article) for article in db_articles]
+        rows = db.query(*ARTICLE_COLUMNS).filter(models.Article.year == year).all()
+        return self._map_rows(rows)
     
+    def get_articles_by_ids(self, db: Session, article_ids: List[int]) -> List[DomainArticle]:
+        if not article_ids:
+            return []
+        rows = db.query(*ARTICLE_COLUMNS).filter(models.Article.article_id.in_(article_ids)).all()
+        by_id = {article.index: article for article in self._map_rows(rows)}
+        return [by_id[article_id] for article_id in article_ids if article_id in by_id]
+
+    def get_articles_in_bbox(self, db: Session, xmin: float, xmax: float, ymin: float, ymax: float,
+                             limit: int) -> List[DomainArticle]:
+        position = func.point(models.Article.coordinate_x, models.Article.coordinate_y)
+        viewport = func.box(func.point(xmin, ymin), func.point(xmax, ymax))
+        rows = (
+            db.query(*ARTICLE_COLUMNS)
+            .filter(position.op("<@")(viewport))
+            .order_by(models.Article.citations.desc().nulls_last(), models.Article.article_id)
+            .limit(limit)
+            .all()
+        )
+        return self._map_rows(rows)
+
+    def get_facets(self, db: Session, article_ids: Optional[List[int]] = None, year: Optional[int] = None,
+                   top_journals: int = 10) -> dict:
+        """Articles per year, most common journals and a citation histogram, grouped in the database"""
+        filters = []
+        if article_ids is not None:
+            filters.append(models.Article.article_id == any_(bindparam("article_ids", article_ids, type_=ARRAY(Integer))))
+        if year is not None:
+            filters.append(models.Article.year == year)
+
+        years = (
+            db.query(models.Article.year, func.count())
+            .filter(*filters)
+            .group_by(models.Article.year)
+            .order_by(models.Article.year.nulls_last())
+            .all()
+        )
+        journals = (
+            db.query(models.Article.journal, func.count(), func.count().over())
+            .filter(*filters)
+            .group_by(models.Article.journal)
+            .order_by(func.count().desc(), models.Article.journal)
+            .limit(top_journals)
+            .all()
+        )
+        bucket = func.width_bucket(models.Article.citations, array(CITATION_BUCKETS))
+        citations = (
+            db.query(bucket, func.count())
+            .filter(*filters, models.Article.citations.isnot(None))
+            .group_by(bucket)
+            .all()
+        )
+
+        counts = dict(citations)
+        histogram = []
+        for number, lower in enumerate(CITATION_BUCKETS, start=1):
+            upper = CITATION_BUCKETS[number] - 1 if number < len(CITATION_BUCKETS) else None
+            histogram.append({"min": lower, "max": upper, "count": counts.get(number, 0)})
+
+        return {
+            "total": sum(count for _, count in years),
+            "years": [{"year": article_year, "count": count} for article_year, count in years],
+            "journals": [{"journal": journal, "count": count} for journal, count, _ in journals],
+            "journal_count": journals[0][2] if journals else 0,
+            "citations": histogram
+        }
+
+    def get_map_points(self, db: Session) -> List[tuple]:
+        return db.query(
+            models.Article.article_id,
+            models.Article.coordinate_x,
+            models.Article.coordinate_y,
+            models.Article.citations,
+            models.Article.journal,
+            models.Article.title
+        ).all()
+
+    def get_suggest_sources(self, db: Session) -> List[tuple]:
+        return db.query(
+            models.Article.article_id,
+            models.Article.title,
+            models.Article.authors,
+            models.Article.journal,
+            models.Article.citations
+        ).all()
+
+    def get_embeddings(self, db: Session, article_ids: Optional[List[int]] = None) -> List[tuple]:
+        query = db.query(models.Article.article_id, models.Article.embeddings).filter(
+            func.cardinality(models.Article.embeddings) > 0
+        )
+        if article_ids is not None:
+            query = query.filter(models.Article.article_id.in_(article_ids))
+        return query.all()
+
+    def iter_embeddings(self, db: Session, chunk_size: int = 5000) -> Iterator[List[tuple]]:
+        """(id, embeddings) rows in id order, streamed from a server-side cursor in chunks"""
+        result = db.execute(
+            select(models.Article.article_id, models.Article.embeddings)
+            .filter(func.cardinality(models.Article.embeddings) > 0)
+            .order_by(models.Article.article_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+    def iter_export_rows(self, db: Session, columns: Sequence[str], year_from: Optional[int] = None,
+                         year_to: Optional[int] = None, chunk_size: int = 5000) -> Iterator[List[tuple]]:
+        """Rows of the named `EXPORT_COLUMNS` in id order, streamed from a server-side cursor in chunks"""
+        query = select(*(EXPORT_COLUMNS[column] for column in columns)).order_by(models.Article.article_id)
+        if year_from is not None:
+            query = query.where(models.Article.year >= year_from)
+        if year_to is not None:
+            query = query.where(models.Article.year <= year_to)
+        for partition in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+            yield [tuple(row) for row in partition]
+
+    def get_embedding_dimension(self, db: Session) -> int:
+        """Length of the stored embeddings, or 0 when there are none"""
+        dimension = func.cardinality(models.Article.embeddings)
+        return db.query(dimension).filter(dimension > 0).limit(1).scalar() or 0
+
+    def get_related_articles(self, db: Session, article_id: int, k: int) -> List[Tuple[float, DomainArticle]]:
+        rows = (
+            db.query(models.ArticleNeighbor.score, *ARTICLE_COLUMNS)
+            .join(models.Article, models.Article.article_id == models.ArticleNeighbor.neighbor_id)
+            .filter(models.ArticleNeighbor.article_id == article_id)
+            .order_by(models.ArticleNeighbor.rank)
+            .limit(k)
+            .all()
+        )
+        return list(zip([row[0] for row in rows], self._map_rows([row[1:] for row in rows])))
+
+    def get_neighbor_floors(self, db: Session) -> Dict[int, Tuple[int, float]]:
+        """article id -> (neighbour count, lowest neighbour score)"""
+        rows = db.query(
+            models.ArticleNeighbor.article_id,
+            func.count(),
+            func.min(models.ArticleNeighbor.score)
+        ).group_by(models.ArticleNeighbor.article_id).all()
+        return {article_id: (count, floor) for article_id, count, floor in rows}
+
+    def get_neighbors(self, db: Session, article_ids: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+        neighbors = {article_id: [] for article_id in article_ids}
+        if not article_ids:
+            return neighbors
+        rows = (
+            db.query(models.ArticleNeighbor.article_id, models.ArticleNeighbor.neighbor_id, models.ArticleNeighbor.score)
+            .filter(models.ArticleNeighbor.article_id.in_(article_ids))
+            .order_by(models.ArticleNeighbor.article_id, models.ArticleNeighbor.rank)
+            .all()
+        )
+        for article_id, neighbor_id, score in rows:
+            neighbors[article_id].append((neighbor_id, score))
+        return neighbors
+
+    def merge_neighbors(self, db: Session, lists: Dict[int, List[Tuple[int, float]]],
+                        candidates: Dict[int, List[Tuple[int, float]]], merge) -> Dict[int, List[Tuple[int, float]]]:
+        """Store `lists` and merge `candidates` into the stored lists of other articles.
+
+        Every list written is locked first, in id order so concurrent merges
+        cannot deadlock, and the lists being merged into are read under that
+        lock, so two merges into the same list cannot lose each other's entries.
+        Returns every list written.
+        """
+        article_ids = sorted(set(lists) | set(candidates))
+        if not article_ids:
+            return {}
+        db.execute(select(func.pg_advisory_xact_lock_shared(NEIGHBORS_LOCK)))
+        db.execute(
+            select(func.pg_advisory_xact_lock(NEIGHBORS_LOCK, func.unnest(bindparam("ids", type_=ARRAY(Integer))))),
+            {"ids": article_ids}
+        )
+
+        updates = dict(lists)
+        current = self.get_neighbors(db, [article_id for article_id in candidates if article_id not in lists])
+        for article_id, neighbours in current.items():
+            for candidate in candidates[article_id]:
+                neighbours = merge(neighbours, candidate)
+            updates[article_id] = neighbours
+        self.replace_neighbors(db, updates)
+        return updates
+
+    def replace_neighbors(self, db: Session, neighbors: Dict[int, List[Tuple[int, float]]],
+                          replace_all: bool = False, chunk_size: int = 10000) -> None:
+        if replace_all:
+            db.execute(select(func.pg_advisory_xact_lock(NEIGHBORS_LOCK)))
+        statement = delete(models.ArticleNeighbor)
+        if not replace_all:
+            statement = statement.where(models.ArticleNeighbor.article_id.in_(list(neighbors)))
+        db.execute(statement)
+
+        chunk = []
+        for article_id, article_neighbors in neighbors.items():
+            for rank, (neighbor_id, score) in enumerate(article_neighbors):
+                chunk.append({"article_id": article_id, "rank": rank, "neighbor_id": neighbor_id, "score": score})
+                if len(chunk) >= chunk_size:
+                    db.execute(insert(models.ArticleNeighbor), chunk)
+                    chunk = []
+        if chunk:
+            db.execute(insert(models.ArticleNeighbor), chunk)
+
     def add_article(self, db: Session, article: DomainArticle) -> DomainArticle:
         db_article = models.Article(
             user_id=article.user_id,
@@ -24,9 +269,14 @@ class DataLink:
             journal=article.journal,
             coordinate_x=article.coordinates.x if article.coordinates else 0.0,
             coordinate_y=article.coordinates.y if article.coordinates else 0.0,
-            embeddings=article.embeddings if article.embeddings else []
+            embeddings=article.embeddings if article.embeddings else [],
+            enrichment_status=article.enrichment_status or "ready"
         )
         db.add(db_article)
+        db.flush()
+        if db_article.enrichment_status == "pending":
+            self.enqueue_enrichment(db, [db_article.article_id])
+        self.record_changes(db, "insert", [db_article.article_id])
         db.commit()
         db.refresh(db_article)
         return self._map_to_domain_article(db_article)
@@ -36,7 +286,9 @@ class DataLink:
         db_article = db.query(models.Article).filter(models.Article.article_id == article_id).first()
         if not db_article:
             return None
-            
+
+        # Only a new abstract needs new embeddings and a new place on the map.
+        abstract_changed = db_article.abstract != article.abstract
         db_article.title = article.title
         db_article.content = article.abstract
         db_article.abstract = article.abstract
@@ -48,27 +300,337 @@ class DataLink:
             db_article.coordinate_x = article.coordinates.x
             db_article.coordinate_y = article.coordinates.y
         db_article.embeddings = article.embeddings if article.embeddings else []
+        if abstract_changed:
+            db_article.enrichment_status = "pending"
+            self.enqueue_enrichment(db, [article_id])
+        self.record_changes(db, "update", [article_id])
         
         db.commit()
         db.refresh(db_article)
         return self._map_to_domain_article(db_article)
     
+    # The bulk methods below do not commit; the caller owns the transaction.
+
+    def get_article_owners(self, db: Session, article_ids: List[int]) -> Dict[int, int]:
+        if not article_ids:
+            return {}
+        rows = db.execute(
+            select(models.Article.article_id, models.Article.user_id)
+            .where(models.Article.article_id.in_(article_ids))
+            .with_for_update()
+        ).all()
+        return {article_id: user_id for article_id, user_id in rows}
+
+    def find_duplicates(self, db: Session, articles: List[DomainArticle]) -> Dict[Tuple[str, str], DomainArticle]:
+        if not articles:
+            return {}
+        titles = {article.title.lower() for article in articles}
+        rows = db.execute(
+            select(*ARTICLE_COLUMNS).where(func.lower(models.Article.title).in_(titles))
+        ).all()
+        return {
+            (existing.title.lower(), existing.authors.lower()): existing
+            for existing in self._map_rows(rows)
+        }
+
+    def bulk_add_articles(self, db: Session, articles: List[DomainArticle]) -> List[DomainArticle]:
+        if not articles:
+            return []
+        rows = db.execute(
+            insert(models.Article).returning(*ARTICLE_COLUMNS, sort_by_parameter_order=True),
+            [self._article_values(article) for article in articles]
+        ).all()
+        created = self._map_rows(rows)
+        self.enqueue_enrichment(db, [article.index for article in created if article.enrichment_status == "pending"])
+        self.record_changes(db, "insert", [article.index for article in created])
+        return created
+
+    def bulk_update_articles(self, db: Session, articles: List[DomainArticle]) -> List[DomainArticle]:
+        if not articles:
+            return []
+        # Embeddings and coordinates are owned by the enrichment worker and left as they are.
+        enriched_fields = ("embeddings", "coordinate_x", "coordinate_y")
+        stored = {
+            article_id: (abstract, status)
+            for article_id, abstract, status in db.execute(
+                select(models.Article.article_id, models.Article.abstract, models.Article.enrichment_status)
+                .where(models.Article.article_id.in_([article.index for article in articles]))
+            ).all()
+        }
+        # Only a new abstract needs new embeddings and a new place on the map.
+        changed = [article.index for article in articles if stored[article.index][0] != article.abstract]
+        db.execute(
+            update(models.Article),
+            [
+                {"article_id": article.index, **{
+                    field: value for field, value in self._article_values(article).items() if field not in enriched_fields
+                }, "enrichment_status": "pending" if article.index in changed else stored[article.index][1]}
+                for article in articles
+            ]
+        )
+        rows = db.execute(
+            select(*ARTICLE_COLUMNS).where(models.Article.article_id.in_([article.index for article in articles]))
+        ).all()
+        by_id = {article.index: article for article in self._map_rows(rows)}
+        self.enqueue_enrichment(db, list(dict.fromkeys(changed)))
+        self.record_changes(db, "update", [article.index for article in articles])
+        return [by_id[article.index] for article in articles]
+
+    def bulk_delete_articles(self, db: Session, article_ids: List[int]) -> None:
+        if article_ids:
+            deleted = db.execute(
+                delete(models.Article).where(models.Article.article_id.in_(article_ids)).returning(models.Article.article_id)
+            ).scalars().all()
+            self.record_changes(db, "delete", deleted)
+
+    def record_changes(self, db: Session, operation: str, article_ids: List[int]) -> None:
+        """Append to the change log inside the caller's transaction.
+
+        Versions come from a sequence, which hands them out before commit.
+        Holding an advisory lock from the insert until commit makes writers
+        commit in version order, so a reader that has seen version N never
+        later finds a smaller version appear.
+
+        Pending ORM changes are flushed first, so every write path takes its
+        row locks before the advisory lock and never the other way round;
+        mixing the two orders deadlocks. Call this after the transaction's
+        last row write.
+        """
+        if not article_ids:
+            return
+        db.flush()
+        db.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK)))
+        db.execute(
+            insert(models.ArticleChange),
+            [{"article_id": article_id, "operation": operation} for article_id in article_ids]
+        )
+
+    def get_changes(self, db: Session, since: int, limit: int) -> dict:
+        """Up to `limit` log entries after version `since`, collapsed to the latest entry per article.
+
+        Inserts and updates carry the article's current state; an article
+        that no longer exists is reported as a delete.
+        """
+        rows = (
+            db.query(models.ArticleChange.version, models.ArticleChange.article_id, models.ArticleChange.operation)
+            .filter(models.ArticleChange.version > since)
+            .order_by(models.ArticleChange.version)
+            .limit(limit)
+            .all()
+        )
+        latest = {}
+        for version, article_id, operation in rows:
+            latest[article_id] = (version, operation)
+
+        live = self.get_articles_by_ids(db, [article_id for article_id, (_, operation) in latest.items() if operation != "delete"])
+        articles = {article.index: article for article in live}
+        changes = [
+            {
+                "version": version,
+                "operation": operation if operation == "delete" or article_id in articles else "delete",
+                "article_id": article_id,
+                "article": articles.get(article_id)
+            }
+            for article_id, (version, operation) in sorted(latest.items(), key=lambda item: item[1][0])
+        ]
+        return {
+            "changes": changes,
+            "next_since": rows[-1][0] if rows else since,
+            "has_more": len(rows) == limit
+        }
+
+    def get_change_version(self, db: Session) -> int:
+        return db.query(func.coalesce(func.max(models.ArticleChange.version), 0)).scalar()
+
+    def enqueue_enrichment(self, db: Session, article_ids: List[int]) -> None:
+        if article_ids:
+            db.execute(insert(models.EnrichmentJob), [{"article_id": article_id} for article_id in article_ids])
+
+    def claim_enrichment_jobs(self, db: Session, limit: int, lease: timedelta) -> List[tuple]:
+        """Mark up to `limit` due jobs as running and return (job_id, article_id, attempts, abstract).
+
+        Running jobs whose lease expired (their worker died) are claimed again.
+        SKIP LOCKED lets several workers poll the queue without blocking each other.
+        """
+        job = models.EnrichmentJob
+        due = (
+            select(job.job_id)
+            .where(or_(
+                and_(job.status == "pending", job.run_after <= func.now()),
+                and_(job.status == "running", job.updated_at < func.now() - lease)
+            ))
+            .order_by(job.job_id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        claimed = db.execute(
+            update(job)
+            .where(job.job_id.in_(due))
+            .values(status="running", attempts=job.attempts + 1, updated_at=func.now())
+            .returning(job.job_id, job.article_id, job.attempts)
+        ).all()
+        if not claimed:
+            return []
+
+        abstracts = dict(db.execute(
+            select(models.Article.article_id, func.coalesce(models.Article.content, models.Article.abstract, ""))
+            .where(models.Article.article_id.in_([article_id for _, article_id, _ in claimed]))
+        ).all())
+        return [(job_id, article_id, attempts, abstracts.get(article_id, "")) for job_id, article_id, attempts in claimed]
+
+    def complete_enrichment_jobs(self, db: Session, results: List[tuple]) -> List[DomainArticle]:
+        """Store (job_id, article_id, embedding, x, y) results and mark the jobs done."""
+        if not results:
+            return []
+        db.execute(
+            update(models.Article),
+            [
+                {"article_id": article_id, "embeddings": embedding, "coordinate_x": x, "coordinate_y": y,
+                 "enrichment_status": "ready"}
+                for _, article_id, embedding, x, y in results
+            ]
+        )
+        db.execute(
+            update(models.EnrichmentJob)
+            .where(models.EnrichmentJob.job_id.in_([job_id for job_id, *_ in results]))
+            .values(status="done", last_error=None, updated_at=func.now())
+        )
+        article_ids = [article_id for _, article_id, *_ in results]
+        self.record_changes(db, "update", article_ids)
+        return self.get_articles_by_ids(db, article_ids)
+
+    def fail_enrichment_jobs(self, db: Session, job_ids: List[int], error: str, max_attempts: int,
+                             backoff: timedelta) -> None:
+        """Put failed jobs back in the queue after `backoff * attempts`, or give up after `max_attempts`."""
+        if not job_ids:
+            return
+        job = models.EnrichmentJob
+        exhausted = db.execute(
+            update(job)
+            .where(job.job_id.in_(job_ids), job.attempts >= max_attempts)
+            .values(status="failed", last_error=error, updated_at=func.now())
+            .returning(job.article_id)
+        ).scalars().all()
+        db.execute(
+            update(job)
+            .where(job.job_id.in_(job_ids), job.attempts < max_attempts)
+            .values(status="pending", last_error=error, updated_at=func.now(),
+                    run_after=func.now() + backoff * job.attempts)
+        )
+        if exhausted:
+            db.execute(
+                update(models.Article)
+                .where(models.Article.article_id.in_(exhausted))
+                .values(enrichment_status="failed")
+            )
+            self.record_changes(db, "update", exhausted)
+
+    def retry_enrichment_job(self, db: Session, job_id: int) -> bool:
+        job = models.EnrichmentJob
+        article_id = db.execute(
+            update(job)
+            .where(job.job_id == job_id, job.status == "failed")
+            .values(status="pending", attempts=0, run_after=func.now(), updated_at=func.now())
+            .returning(job.article_id)
+        ).scalar()
+        if article_id is None:
+            return False
+        db.execute(
+            update(models.Article).where(models.Article.article_id == article_id).values(enrichment_status="pending")
+        )
+        self.record_changes(db, "update", [article_id])
+        return True
+
+    def get_enrichment_job(self, db: Session, job_id: int = None, article_id: int = None) -> Optional[dict]:
+        """A job by id, or the most recent job of an article"""
+        query = db.query(models.EnrichmentJob)
+        if job_id is not None:
+            query = query.filter(models.EnrichmentJob.job_id == job_id)
+        else:
+            query = query.filter(models.EnrichmentJob.article_id == article_id).order_by(models.EnrichmentJob.job_id.desc())
+        job = query.first()
+        if job is None:
+            return None
+        return {
+            "job_id": job.job_id,
+            "article_id": job.article_id,
+            "status": job.status,
+            "attempts": job.attempts,
+            "last_error": job.last_error,
+            "run_after": job.run_after,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at
+        }
+
+    def get_layout_reference(self, db: Session, limit: int) -> List[tuple]:
+        """(embeddings, x, y) of enriched articles, used to place new articles on the map"""
+        return (
+            db.query(models.Article.embeddings, models.Article.coordinate_x, models.Article.coordinate_y)
+            .filter(models.Article.enrichment_status == "ready", func.cardinality(models.Article.embeddings) > 0)
+            .order_by(models.Article.article_id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def _article_values(self, article: DomainArticle) -> dict:
+        return {
+            "user_id": article.user_id,
+            "title": article.title,
+            "content": article.abstract,
+            "abstract": article.abstract,
+            "year": article.year,
+            "citations": article.citations,
+            "authors": article.authors,
+            "journal": article.journal,
+            "coordinate_x": article.coordinates.x if article.coordinates else 0.0,
+            "coordinate_y": article.coordinates.y if article.coordinates else 0.0,
+            "embeddings": article.embeddings if article.embeddings else [],
+            "enrichment_status": article.enrichment_status or "ready"
+        }
+
     def delete_article(self, db: Session, article_id: int) -> bool:
         db_article = db.query(models.Article).filter(models.Article.article_id == article_id).first()
         if not db_article:
             return False
             
         db.delete(db_article)
+        self.record_changes(db, "delete", [article_id])
         db.commit()
         return True
     
+    # Rows coming back from the database are already typed by their columns,
+    # so domain objects are built with `model_construct` and skip validation.
+    # API input still goes through the validating `Article.__init__`.
+    def _map_rows(self, rows: Sequence[tuple]) -> List[DomainArticle]:
+        construct_article = DomainArticle.model_construct
+        construct_coordinates = Coordinates.model_construct
+        return [
+            construct_article(
+                id=str(article_id),
+                index=article_id,
+                title=title,
+                abstract=content or abstract or "",
+                authors=authors,
+                journal=journal,
+                year=year,
+                citations=citations,
+                coordinates=construct_coordinates(x=coordinate_x, y=coordinate_y),
+                embeddings=embeddings or [],
+                user_id=user_id,
+                enrichment_status=enrichment_status
+            )
+            for (article_id, user_id, title, content, abstract, year, citations,
+                 authors, journal, coordinate_x, coordinate_y, embeddings, enrichment_status) in rows
+        ]
+
     def _map_to_domain_article(self, db_article: models.Article) -> DomainArticle:
-        coordinates = Coordinates(
+        coordinates = Coordinates.model_construct(
             x=db_article.coordinate_x,
             y=db_article.coordinate_y
         )
         
-        return DomainArticle(
+        return DomainArticle.model_construct(
             id=str(db_article.article_id),
             index=db_article.article_id,
             title=db_article.title,
@@ -79,5 +641,6 @@ class DataLink:
             citations=db_article.citations,
             coordinates=coordinates,
             embeddings=db_article.embeddings or [],
-            user_id=db_article.user_id
+            user_id=db_article.user_id,
+            enrichment_status=db_article.enrichment_status
         )
\ No newline at end of file
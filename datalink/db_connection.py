@@ -1,11 +1,17 @@
+import os
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from .routing import SessionRouter
 
-DATABASE_URL = "postgresql://cretuluca:@localhost:5432/postgres"
+DATABASE_URL = os.environ.get("DATABASE_URL", "postgresql://cretuluca:@localhost:5432/postgres")
+# Comma-separated URLs of streaming replicas of DATABASE_URL; reads are spread over them.
+REPLICA_DATABASE_URLS = [url.strip() for url in os.environ.get("REPLICA_DATABASE_URLS", "").split(",") if url.strip()]
 
 engine = create_engine(DATABASE_URL)
+replica_engines = [create_engine(url) for url in REPLICA_DATABASE_URLS]
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+session_router = SessionRouter(SessionLocal, replica_engines)
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +19,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
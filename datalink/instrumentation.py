@@ -0,0 +1,93 @@
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QueryListener = Callable[[str, object, float], None]
+
+
+class QueryStats:
+    """Queries issued and time spent in the database while serving one request."""
+    __slots__ = ("count", "duration", "path")
+
+    def __init__(self, path: Optional[str] = None):
+        self.count = 0
+        self.duration = 0.0
+        self.path = path
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+class QueryInstrumentation:
+    def __init__(self):
+        self._listeners: List[QueryListener] = []
+
+    def add_listener(self, listener: QueryListener) -> None:
+        self._listeners.append(listener)
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_start_time = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - context._query_start_time
+
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += duration
+
+        for listener in self._listeners:
+            listener(statement, parameters, duration)
+
+
+def redact_parameters(parameters: object) -> object:
+    """Bound parameters with their values replaced by type names; they can hold usernames and password hashes"""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: one set of parameters per row, which all share a shape.
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """Keeps the most recent statements slower than `threshold` seconds and logs them."""
+    MAX_PARAMETERS_LENGTH = 500
+
+    def __init__(self, threshold: float, capacity: int = 200):
+        self.threshold = threshold
+        self.entries = deque(maxlen=capacity)
+        self.logger = logging.getLogger("faust_scrolls.slow_query")
+
+    def __call__(self, statement: str, parameters: object, duration: float) -> None:
+        if duration < self.threshold:
+            return
+
+        stats = current_query_stats.get()
+        rendered_parameters = repr(redact_parameters(parameters))
+        if len(rendered_parameters) > self.MAX_PARAMETERS_LENGTH:
+            rendered_parameters = rendered_parameters[:self.MAX_PARAMETERS_LENGTH] + "..."
+
+        entry = {
+            "statement": statement,
+            "parameters": rendered_parameters,
+            "duration_ms": round(duration * 1000, 3),
+            "path": stats.path if stats is not None else None,
+            "logged_at": time.time()
+        }
+        self.entries.append(entry)
+        self.logger.warning("slow query (%.1f ms) on %s: %s | %s",
+                            entry["duration_ms"], entry["path"], statement, rendered_parameters)
+
+    def recent(self, limit: int = 50) -> list:
+        return list(self.entries)[-limit:][::-1]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float
+from sqlalchemy import BigInteger, Column, Integer, String, Text, ForeignKey, Float, Index, DateTime, func
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from .db_connection import Base
@@ -28,5 +28,46 @@ class Article(Base):
     coordinate_x = Column(Float, default=0.0)
     coordinate_y = Column(Float, default=0.0)
     embeddings = Column(ARRAY(Float), default=[])
+    # "pending" until the enrichment worker has stored embeddings and coordinates
+    enrichment_status = Column(String(20), nullable=False, default="ready", server_default="ready")
     
-    user = relationship("User", back_populates="articles")
\ No newline at end of file
+    user = relationship("User", back_populates="articles")
+
+    __table_args__ = (
+        # GiST index on the map position, used by viewport queries (`point <@ box`)
+        Index("ix_articles_position", func.point(coordinate_x, coordinate_y), postgresql_using="gist"),
+    )
+
+class ArticleNeighbor(Base):
+    __tablename__ = "article_neighbors"
+
+    article_id = Column(Integer, ForeignKey("articles.article_id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbor_id = Column(Integer, ForeignKey("articles.article_id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float, nullable=False)
+
+
+class EnrichmentJob(Base):
+    __tablename__ = "enrichment_jobs"
+
+    job_id = Column(Integer, primary_key=True)
+    article_id = Column(Integer, ForeignKey("articles.article_id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    run_after = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_enrichment_jobs_queue", "status", "run_after"),
+    )
+
+class ArticleChange(Base):
+    """Append-only log of article writes; `version` orders them. Deletes are kept as tombstones."""
+    __tablename__ = "article_changes"
+
+    version = Column(BigInteger, primary_key=True, autoincrement=True)
+    article_id = Column(Integer, nullable=False, index=True)
+    operation = Column(String(10), nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
@@ -0,0 +1,140 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+
+def parse_lsn(lsn: Optional[str]) -> Optional[int]:
+    """Postgres WAL position `X/Y` (two hex numbers) as one comparable integer"""
+    if not lsn:
+        return None
+    high, _, low = lsn.partition("/")
+    try:
+        return (int(high, 16) << 32) + int(low, 16)
+    except ValueError:
+        return None
+
+
+def format_lsn(position: int) -> str:
+    return f"{position >> 32:X}/{position & 0xFFFFFFFF:X}"
+
+
+class ConsistencyToken:
+    """WAL positions a request must read at (`required`) and has written up to (`written`)."""
+    __slots__ = ("required", "written")
+
+    def __init__(self, required: Optional[int] = None):
+        self.required = required
+        self.written: Optional[int] = None
+
+    @property
+    def minimum(self) -> Optional[int]:
+        positions = [position for position in (self.required, self.written) if position is not None]
+        return max(positions) if positions else None
+
+
+current_consistency: ContextVar[Optional[ConsistencyToken]] = ContextVar("current_consistency", default=None)
+reading_primary: ContextVar[bool] = ContextVar("reading_primary", default=False)
+
+
+@contextmanager
+def primary_reads():
+    """Send every read in the block to the primary.
+
+    For read-modify-write paths, such as background jobs, that have no
+    consistency token but must see the latest committed state.
+    """
+    token = reading_primary.set(True)
+    try:
+        yield
+    finally:
+        reading_primary.reset(token)
+
+
+class SessionRouter:
+    """Sends reads to read replicas and everything else to the primary.
+
+    A read goes to the next replica (round robin) whose replayed WAL
+    position has reached the current request's consistency token, that is
+    the primary's WAL position after the caller's last write. When no
+    replica has caught up, or none is reachable, the read goes to the
+    primary. Replica positions are cached for `lag_check_interval` seconds
+    so most token checks cost no round trip.
+    """
+
+    def __init__(self, primary: sessionmaker, replicas: List[Engine] = None, lag_check_interval: float = 0.05,
+                 unhealthy_seconds: float = 5.0):
+        self.primary = primary
+        self.replicas = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replicas or []]
+        self.lag_check_interval = lag_check_interval
+        self.unhealthy_seconds = unhealthy_seconds
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+        self._lock = threading.Lock()
+        self._next = 0
+        self._replayed: Dict[int, tuple] = {}
+        self._unhealthy_until: Dict[int, float] = {}
+
+    def write_session(self) -> Session:
+        return self.primary()
+
+    def read_session(self) -> Session:
+        if not self.replicas or reading_primary.get():
+            return self.primary()
+
+        token = current_consistency.get()
+        required = token.minimum if token else None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+
+        for offset in range(len(self.replicas)):
+            number = (start + offset) % len(self.replicas)
+            if self._unhealthy_until.get(number, 0.0) > time.monotonic():
+                continue
+            if required is None or self._caught_up(number, required):
+                self.replica_reads += 1
+                return self.replicas[number]()
+
+        self.primary_fallbacks += 1
+        return self.primary()
+
+    def is_replica(self, db: Session) -> bool:
+        return any(db.bind is replica.kw["bind"] for replica in self.replicas)
+
+    def mark_unhealthy(self, db: Session) -> None:
+        for number, replica in enumerate(self.replicas):
+            if db.bind is replica.kw["bind"]:
+                self._unhealthy_until[number] = time.monotonic() + self.unhealthy_seconds
+
+    def record_write(self, db: Session) -> None:
+        """Advance the request's token to the primary's WAL position; call after committing"""
+        token = current_consistency.get()
+        if not self.replicas or token is None:
+            return
+        position = parse_lsn(db.execute(select(func.pg_current_wal_lsn())).scalar())
+        if position is not None and (token.written is None or position > token.written):
+            token.written = position
+
+    def _caught_up(self, number: int, required: int) -> bool:
+        replayed, checked_at = self._replayed.get(number, (None, 0.0))
+        if replayed is not None and replayed >= required:
+            return True
+        if time.monotonic() - checked_at < self.lag_check_interval:
+            return False
+
+        try:
+            with self.replicas[number]() as db:
+                # NULL on a server that is not replaying WAL, which is never treated as caught up.
+                replayed = parse_lsn(db.execute(select(func.pg_last_wal_replay_lsn())).scalar())
+        except DBAPIError:
+            self._unhealthy_until[number] = time.monotonic() + self.unhealthy_seconds
+            return False
+
+        self._replayed[number] = (replayed, time.monotonic())
+        return replayed is not None and replayed >= required
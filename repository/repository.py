@@ -95,33 +95,155 @@ class Repository:
         self.articles = [article for article in self.articles if article.index != index]
 '''
 
-from datalink.db_connection import SessionLocal
+from datalink.db_connection import SessionLocal, session_router
 from datalink.data_link import DataLink
+from datalink.routing import SessionRouter
 from data.domain import Article
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
 
 class Repository:
     data_link: DataLink
     
-    def __init__(self):
+    def __init__(self, router: SessionRouter = None):
         self.data_link = DataLink()
+        self.router = router or session_router
+
+    def _read(self, query: Callable[[Session], T]) -> T:
+        """Run a read on a replica that has caught up with the caller's writes, else on the primary"""
+        with self.router.read_session() as db:
+            if not self.router.is_replica(db):
+                return query(db)
+            try:
+                return query(db)
+            except DBAPIError as e:
+                print(f"Read replica failed, retrying on the primary: {e}")
+                self.router.mark_unhealthy(db)
+        with SessionLocal() as db:
+            return query(db)
     
     def get_articles(self) -> list[Article]:
-        with SessionLocal() as db:
-            return self.data_link.get_articles(db)
+        return self._read(lambda db: self.data_link.get_articles(db))
     
     def get_articles_by_year(self, year: int) -> list[Article]:
+        return self._read(lambda db: self.data_link.get_articles_by_year(db, year))
+    
+    def get_articles_by_ids(self, article_ids: list[int]) -> list[Article]:
+        """Articles for the given ids, in the order the ids were given"""
+        return self._read(lambda db: self.data_link.get_articles_by_ids(db, article_ids))
+    
+    def get_articles_in_bbox(self, xmin: float, xmax: float, ymin: float, ymax: float, limit: int) -> list[Article]:
+        return self._read(lambda db: self.data_link.get_articles_in_bbox(db, xmin, xmax, ymin, ymax, limit))
+    
+    def get_facets(self, article_ids: list[int] = None, year: int = None, top_journals: int = 10) -> dict:
+        return self._read(lambda db: self.data_link.get_facets(db, article_ids, year, top_journals))
+    
+    def get_changes(self, since: int, limit: int) -> dict:
+        return self._read(lambda db: self.data_link.get_changes(db, since, limit))
+
+    def get_change_version(self) -> int:
+        return self._read(lambda db: self.data_link.get_change_version(db))
+
+    def get_articles_with_version(self) -> Tuple[int, list[Article]]:
+        """Every article and a change version at or before them, read from the same server"""
+        return self._read(lambda db: (self.data_link.get_change_version(db), self.data_link.get_articles(db)))
+    
+    def get_map_points(self) -> list[tuple]:
+        """(index, x, y, citations, journal, title) for every article"""
+        return self._read(lambda db: self.data_link.get_map_points(db))
+    
+    def get_suggest_sources(self) -> list[tuple]:
+        """(index, title, authors, journal, citations) for every article"""
+        return self._read(lambda db: self.data_link.get_suggest_sources(db))
+    
+    def get_embeddings(self, article_ids: list[int] = None) -> list[tuple]:
+        """(index, embeddings) for articles that have an embedding"""
+        return self._read(lambda db: self.data_link.get_embeddings(db, article_ids))
+
+    def iter_embeddings(self, chunk_size: int = 5000) -> Iterator[list[tuple]]:
+        """Chunks of (index, embeddings) rows in index order"""
+        with self.router.read_session() as db:
+            yield from self.data_link.iter_embeddings(db, chunk_size)
+
+    def iter_export_rows(self, columns: list[str], year_from: int = None, year_to: int = None,
+                         chunk_size: int = 5000) -> Iterator[list[tuple]]:
+        with self.router.read_session() as db:
+            yield from self.data_link.iter_export_rows(db, columns, year_from, year_to, chunk_size)
+
+    def get_embedding_dimension(self) -> int:
+        return self._read(lambda db: self.data_link.get_embedding_dimension(db))
+
+    def get_related_articles(self, index: int, k: int) -> list[tuple[float, Article]]:
+        return self._read(lambda db: self.data_link.get_related_articles(db, index, k))
+
+    def get_neighbor_floors(self) -> Dict[int, Tuple[int, float]]:
+        return self._read(lambda db: self.data_link.get_neighbor_floors(db))
+
+    def get_neighbors(self, article_ids: list[int]) -> Dict[int, List[Tuple[int, float]]]:
+        return self._read(lambda db: self.data_link.get_neighbors(db, article_ids))
+
+    def merge_neighbors(self, lists: Dict[int, List[Tuple[int, float]]], candidates: Dict[int, List[Tuple[int, float]]],
+                        merge) -> Dict[int, List[Tuple[int, float]]]:
         with SessionLocal() as db:
-            return self.data_link.get_articles_by_year(db, year)
+            updates = self.data_link.merge_neighbors(db, lists, candidates, merge)
+            db.commit()
+            self.router.record_write(db)
+            return updates
+
+    def replace_neighbors(self, neighbors: Dict[int, List[Tuple[int, float]]], replace_all: bool = False) -> None:
+        with SessionLocal() as db:
+            self.data_link.replace_neighbors(db, neighbors, replace_all)
+            db.commit()
+            self.router.record_write(db)
+    
+    def claim_enrichment_jobs(self, limit: int, lease: timedelta) -> list[tuple]:
+        with SessionLocal() as db:
+            jobs = self.data_link.claim_enrichment_jobs(db, limit, lease)
+            db.commit()
+            return jobs
+
+    def complete_enrichment_jobs(self, results: list[tuple]) -> list[Article]:
+        with SessionLocal() as db:
+            articles = self.data_link.complete_enrichment_jobs(db, results)
+            db.commit()
+            self.router.record_write(db)
+            return articles
+
+    def fail_enrichment_jobs(self, job_ids: list[int], error: str, max_attempts: int, backoff: timedelta) -> None:
+        with SessionLocal() as db:
+            self.data_link.fail_enrichment_jobs(db, job_ids, error, max_attempts, backoff)
+            db.commit()
+            self.router.record_write(db)
+
+    def retry_enrichment_job(self, job_id: int) -> bool:
+        with SessionLocal() as db:
+            retried = self.data_link.retry_enrichment_job(db, job_id)
+            db.commit()
+            self.router.record_write(db)
+            return retried
+
+    def get_enrichment_job(self, job_id: int = None, article_id: int = None) -> Optional[dict]:
+        return self._read(lambda db: self.data_link.get_enrichment_job(db, job_id, article_id))
+
+    def get_layout_reference(self, limit: int) -> list[tuple]:
+        return self._read(lambda db: self.data_link.get_layout_reference(db, limit))
     
     def add_article(self, article: Article) -> Article:
         with SessionLocal() as db:
-            return self.data_link.add_article(db, article)
+            saved = self.data_link.add_article(db, article)
+            self.router.record_write(db)
+            return saved
     
     def update_article(self, article: Article) -> Article:
         with SessionLocal() as db:
             updated = self.data_link.update_article(db, article)
             if not updated:
                 raise ValueError(f"Article with index {article.index} not found")
+            self.router.record_write(db)
             return updated
     
     def delete_article(self, article_id: str) -> None:
@@ -129,9 +251,83 @@ class Repository:
             success = self.data_link.delete_article(db, int(article_id))
             if not success:
                 raise ValueError(f"Article with id {article_id} not found")
+            self.router.record_write(db)
     
     def delete_article_by_index(self, index: int) -> None:
         with SessionLocal() as db:
             success = self.data_link.delete_article(db, index)
             if not success:
-                raise ValueError(f"Article with index {index} not found")
\ No newline at end of file
+                raise ValueError(f"Article with index {index} not found")
+            self.router.record_write(db)
+
+    def apply_batch(self, creates: List[Article], updates: List[Article], delete_ids: List[int], user_id: int) -> dict:
+        """Apply creates, updates and deletes in one transaction and report a result per item.
+
+        Updates and deletes of articles owned by someone else are rejected, as
+        are creates whose title and authors match an existing article.
+        """
+        with SessionLocal() as db:
+            owners = self.data_link.get_article_owners(db, [article.index for article in updates] + delete_ids)
+
+            update_results = []
+            accepted_updates = []
+            for article in updates:
+                owner = owners.get(article.index)
+                if owner is None:
+                    update_results.append({"status": "not_found", "id": str(article.index)})
+                elif owner != user_id:
+                    update_results.append({"status": "forbidden", "id": str(article.index)})
+                else:
+                    update_results.append(None)
+                    accepted_updates.append(article)
+
+            delete_results = []
+            accepted_deletes = []
+            for article_id in delete_ids:
+                owner = owners.get(article_id)
+                if owner is None:
+                    delete_results.append({"status": "not_found", "id": str(article_id)})
+                elif owner != user_id:
+                    delete_results.append({"status": "forbidden", "id": str(article_id)})
+                else:
+                    delete_results.append({"status": "deleted", "id": str(article_id)})
+                    if article_id not in accepted_deletes:
+                        accepted_deletes.append(article_id)
+
+            existing = self.data_link.find_duplicates(db, creates)
+            create_positions = []
+            accepted_creates = []
+            first_in_batch = {}
+            for article in creates:
+                key = (article.title.lower(), article.authors.lower())
+                if key in existing:
+                    create_positions.append(existing[key])
+                elif key in first_in_batch:
+                    create_positions.append(first_in_batch[key])
+                else:
+                    first_in_batch[key] = len(accepted_creates)
+                    create_positions.append(len(accepted_creates))
+                    accepted_creates.append(article)
+
+            created = self.data_link.bulk_add_articles(db, accepted_creates)
+            updated = iter(self.data_link.bulk_update_articles(db, accepted_updates))
+            self.data_link.bulk_delete_articles(db, accepted_deletes)
+            db.commit()
+            self.router.record_write(db)
+
+            create_results = []
+            seen = set()
+            for position in create_positions:
+                if isinstance(position, Article):
+                    create_results.append({"status": "duplicate", "article": position})
+                elif position in seen:
+                    create_results.append({"status": "duplicate", "article": created[position]})
+                else:
+                    seen.add(position)
+                    create_results.append({"status": "created", "article": created[position]})
+
+            return {
+                "creates": create_results,
+                "updates": [result or {"status": "updated", "article": next(updated)} for result in update_results],
+                "deletes": delete_results
+            }
@@ -0,0 +1,20 @@
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datalink.db_connection import Base, engine
+from repository.repository import Repository
+from services.service import Service
+
+Base.metadata.create_all(bind=engine)
+
+def build_knn_graph():
+    service = Service(Repository())
+    started = time.perf_counter()
+    service.rebuild_related_articles()
+    print(f"Built related-articles graph in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    build_knn_graph()
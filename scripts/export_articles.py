@@ -0,0 +1,41 @@
+import argparse
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datalink.db_connection import Base, engine
+from repository.repository import Repository
+from services.service import Service
+from services.export_service import EXTENSIONS, FORMATS, parse_columns
+
+Base.metadata.create_all(bind=engine)
+
+def export_articles(output, format, columns=None, year_from=None, year_to=None, chunk_size=5000):
+    service = Service(Repository())
+    started = time.perf_counter()
+    written = 0
+    with open(output, "wb") as file:
+        for data in service.export_articles(format, parse_columns(columns), year_from, year_to, chunk_size):
+            file.write(data)
+            written += len(data)
+    print(f"Exported {written / 1e6:.1f} MB of {format} to {output} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the articles table for analytics")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--output", help="defaults to articles.<format extension>")
+    parser.add_argument("--columns", help="comma-separated column names, all columns by default")
+    parser.add_argument("--year-from", type=int)
+    parser.add_argument("--year-to", type=int)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per row group / record batch")
+    args = parser.parse_args()
+    export_articles(
+        args.output or f"articles.{EXTENSIONS[args.format]}",
+        args.format,
+        args.columns,
+        args.year_from,
+        args.year_to,
+        args.chunk_size
+    )
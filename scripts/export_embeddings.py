@@ -0,0 +1,27 @@
+import argparse
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datalink.db_connection import Base, engine
+from repository.repository import Repository
+from services.service import Service
+
+Base.metadata.create_all(bind=engine)
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots", "embeddings")
+
+def export_embeddings(output: str, dtype: str):
+    service = Service(Repository())
+    started = time.perf_counter()
+    count = service.export_embedding_snapshot(output, dtype)
+    print(f"Wrote {count} {dtype} embeddings to {output} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export article embeddings as a quantized, memory-mappable snapshot")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--dtype", choices=["int8", "float16"], default="int8")
+    args = parser.parse_args()
+    export_embeddings(args.output, args.dtype)
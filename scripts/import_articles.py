@@ -1,15 +1,62 @@
+import glob
 import json
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import pandas as pd
+from sqlalchemy import insert
+
 from datalink.db_connection import SessionLocal, Base, engine
+from datalink.data_link import DataLink
 from datalink.models import User, Article
-from sqlalchemy.orm import Session
+from services.validation_service import ValidationService
 
 Base.metadata.create_all(bind=engine)
 
+CHUNK_SIZE = 10000
+MAX_REPORTED_REJECTIONS = 20
+
+def article_rows(chunk: pd.DataFrame, user_id: int) -> list[dict]:
+    coordinates = chunk["coordinates"] if "coordinates" in chunk else pd.Series([{}] * len(chunk), index=chunk.index)
+    embeddings = chunk["embedding"] if "embedding" in chunk else pd.Series([[]] * len(chunk), index=chunk.index)
+    return [
+        {
+            "user_id": user_id,
+            "title": title.replace('\n', ' ').strip(),
+            "content": abstract,
+            "abstract": abstract,
+            "year": int(float(year)),
+            "citations": int(float(citations)),
+            "authors": authors,
+            "journal": journal,
+            "coordinate_x": float((point or {}).get('x', 0.0)),
+            "coordinate_y": float((point or {}).get('y', 0.0)),
+            "embeddings": embedding if isinstance(embedding, list) else []
+        }
+        for title, abstract, year, citations, authors, journal, point, embedding in zip(
+            chunk["title"], chunk["abstract"], chunk["year"], chunk["citations"],
+            chunk["authors"], chunk["journal"], coordinates, embeddings
+        )
+    ]
+
+def read_articles(path) -> pd.DataFrame:
+    """A JSON array, an NDJSON or Parquet shard, or a directory of shards written by preprocess_articles.py"""
+    if os.path.isdir(path):
+        shards = sorted(glob.glob(os.path.join(path, "articles-*.parquet"))) or \
+            sorted(glob.glob(os.path.join(path, "articles-*.ndjson")))
+        return pd.concat([read_articles(shard) for shard in shards], ignore_index=True)
+    if path.endswith(".parquet"):
+        frame = pd.read_parquet(path)
+        if "embedding" in frame:
+            frame["embedding"] = [embedding.tolist() for embedding in frame["embedding"]]
+        return frame
+    if path.endswith((".ndjson", ".jsonl")):
+        return pd.read_json(path, lines=True, dtype=False)
+    with open(path, 'r') as file:
+        return pd.DataFrame(json.load(file))
+
 def import_articles_from_json(json_file_path):
     with SessionLocal() as db:
         default_user = db.query(User).first()
@@ -23,30 +70,43 @@ def import_articles_from_json(json_file_path):
             db.commit()
             db.refresh(default_user)
             print(f"Created default user with ID: {default_user.user_id}")
-        
-        with open(json_file_path, 'r') as file:
-            articles_data = json.load(file)
-        
-        for article_data in articles_data:
-            article = Article(
-                user_id=default_user.user_id,
-                title=article_data.get('title', '').replace('\n', ' ').strip(),
-                content=article_data.get('abstract', ''),
-                abstract=article_data.get('abstract', ''),
-                year=int(article_data.get('year', 0)),
-                citations=int(article_data.get('citations', 0)),
-                authors=article_data.get('authors', 'Unknown'),
-                journal=article_data.get('journal', 'Unknown'),
-                coordinate_x=float(article_data.get('coordinates', {}).get('x', 0.0)),
-                coordinate_y=float(article_data.get('coordinates', {}).get('y', 0.0)),
-                embeddings=article_data.get('embedding', [])
-            )
-            
-            db.add(article)
-        
-        db.commit()
-        print(f"Imported {len(articles_data)} articles into the database")
+
+        frame = read_articles(json_file_path)
+        for column, default in (("authors", "Unknown"), ("journal", "Unknown"), ("citations", 0)):
+            frame[column] = frame[column].fillna(default) if column in frame else default
+
+        user_id = default_user.user_id
+        validation_service = ValidationService()
+        data_link = DataLink()
+        imported = 0
+        rejected = []
+        for start in range(0, len(frame), CHUNK_SIZE):
+            chunk = frame.iloc[start:start + CHUNK_SIZE]
+            errors = validation_service.validate_batch(chunk)
+            rejected.extend((start + position, reasons) for position, reasons in errors.items())
+
+            valid = chunk.drop(chunk.index[list(errors)]) if errors else chunk
+            if valid.empty:
+                continue
+            article_ids = db.execute(
+                insert(Article).returning(Article.article_id),
+                article_rows(valid, user_id)
+            ).scalars().all()
+            data_link.record_changes(db, "insert", article_ids)
+            # One transaction per chunk: the change-log lock is held until commit and blocks every API write.
+            db.commit()
+            imported += len(article_ids)
+
+        print(f"Imported {imported} articles into the database")
+
+        if rejected:
+            print(f"Rejected {len(rejected)} articles:")
+            for row, reasons in rejected[:MAX_REPORTED_REJECTIONS]:
+                print(f"  row {row}: {'; '.join(reasons)}")
+            if len(rejected) > MAX_REPORTED_REJECTIONS:
+                print(f"  ... and {len(rejected) - MAX_REPORTED_REJECTIONS} more")
 
 if __name__ == "__main__":
-    json_file_path = "/Users/cretuluca/uni/faust-scrolls-full/faust-scrolls-backend/data/raw/articles-with-embeddings.json"
-    import_articles_from_json(json_file_path)
\ No newline at end of file
+    json_file_path = sys.argv[1] if len(sys.argv) > 1 else \
+        "/Users/cretuluca/uni/faust-scrolls-full/faust-scrolls-backend/data/raw/articles-with-embeddings.json"
+    import_articles_from_json(json_file_path)
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+
+DEFAULT_MIX = "all_articles=1,search=4,article=10,token=1,add_article=2,update_article=1,upload=1,download=2"
+WRITE_MESSAGES = ("new_article", "article_updated")
+SEARCH_WORDS = ("quantum", "neural", "galaxy", "graph", "protein", "lattice", "network", "spin", "model", "theory")
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in LoadTest.OPERATIONS:
+            raise ValueError(f"Unknown operation {name.strip()!r}, expected one of {', '.join(LoadTest.OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses = Counter()
+
+    def record(self, seconds: float, status) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        count = len(self.latencies)
+        p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99]) * 1000 if count else (0.0, 0.0, 0.0)
+        return {
+            "requests": count,
+            "throughput": count / elapsed if elapsed else 0.0,
+            "errors": self.errors,
+            "error_rate": self.errors / count if count else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": max(self.latencies) * 1000 if count else 0.0,
+            "statuses": {str(status): number for status, number in sorted(self.statuses.items(), key=str)}
+        }
+
+class LoadTest:
+    """Open-loop load against a running instance.
+
+    Requests start at `rate` per second (Poisson arrivals) regardless of
+    how fast earlier ones finish, so queueing in the server shows up as
+    latency instead of being hidden by a slower client. Arrivals that find
+    `concurrency` requests already in flight are counted as dropped: the
+    client, not the server, is then the bottleneck. `/ws` subscribers time
+    the broadcasts of this run's own writes, from the write request being
+    sent to the message arriving.
+    """
+
+    OPERATIONS = ("all_articles", "search", "article", "token", "add_article", "update_article", "upload", "download")
+
+    def __init__(self, base_url: str, rate: float, duration: float, mix: Dict[str, float], users: int = 4,
+                 subscribers: int = 0, concurrency: int = 256, upload_size: int = 64 * 1024, timeout: float = 30.0,
+                 cleanup: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix
+        self.users = users
+        self.subscribers = subscribers
+        self.concurrency = concurrency
+        self.upload_size = upload_size
+        self.timeout = timeout
+        self.cleanup = cleanup
+        self.run_id = uuid.uuid4().hex[:8]
+        self.stats: Dict[str, RouteStats] = {}
+        self.broadcasts = RouteStats()
+        self.dropped = 0
+        self.in_flight = 0
+        self.indexes: List[int] = []
+        self.credentials: List[tuple] = []
+        self.tokens: List[Optional[str]] = []
+        self.created: List[tuple] = []
+        self.uploaded: List[str] = []
+        self.sent_writes: Dict[str, float] = {}
+        self._sequence = 0
+
+    def _route(self, name: str) -> RouteStats:
+        return self.stats.setdefault(name, RouteStats())
+
+    async def _request(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self._route(route).record(time.perf_counter() - started, type(e).__name__)
+            return None
+        self._route(route).record(time.perf_counter() - started, response.status_code)
+        return response
+
+    def _next_title(self) -> str:
+        self._sequence += 1
+        return f"Load test {self.run_id} #{self._sequence}"
+
+    def _user(self) -> int:
+        return random.randrange(len(self.credentials))
+
+    async def setup(self, client: httpx.AsyncClient) -> None:
+        response = await client.get("/all_articles")
+        response.raise_for_status()
+        self.indexes = [article["index"] for article in response.json() if article.get("index") is not None]
+
+        for number in range(self.users):
+            username, password = f"loadtest-{self.run_id}-{number}", uuid.uuid4().hex
+            response = await client.post("/register", json={"username": username, "password": password})
+            response.raise_for_status()
+            response = await client.post("/token", data={"username": username, "password": password})
+            response.raise_for_status()
+            self.credentials.append((username, password))
+            self.tokens.append(response.json()["access_token"])
+
+    async def all_articles(self, client):
+        await self._request(client, "GET /all_articles", "GET", "/all_articles")
+
+    async def search(self, client):
+        await self._request(client, "GET /search", "GET", "/search", params={"query": random.choice(SEARCH_WORDS)})
+
+    async def article(self, client):
+        index = random.choice(self.indexes) if self.indexes else 0
+        await self._request(client, "GET /article/{index}", "GET", f"/article/{index}")
+
+    async def token(self, client):
+        user = self._user()
+        username, password = self.credentials[user]
+        response = await self._request(client, "POST /token", "POST", "/token",
+                                       data={"username": username, "password": password})
+        if response is not None and response.status_code == 200:
+            self.tokens[user] = response.json()["access_token"]
+
+    def _article_body(self, title: str) -> dict:
+        return {
+            "title": title,
+            "authors": "Load Test",
+            "journal": "Load Test",
+            "abstract": f"Synthetic abstract for {title} about {' '.join(random.sample(SEARCH_WORDS, 3))}.",
+            "year": 2024,
+            "citations": 0
+        }
+
+    async def add_article(self, client):
+        user, title = self._user(), self._next_title()
+        self.sent_writes[title] = time.perf_counter()
+        response = await self._request(client, "POST /add_article", "POST", "/add_article", json=self._article_body(title),
+                                       headers={"Authorization": f"Bearer {self.tokens[user]}"})
+        if response is not None and response.status_code == 200:
+            self.created.append((user, response.json()["index"]))
+
+    async def update_article(self, client):
+        if not self.created:
+            return await self.add_article(client)
+        (user, index), title = random.choice(self.created), self._next_title()
+        self.sent_writes[title] = time.perf_counter()
+        await self._request(client, "PUT /articles/{id}", "PUT", f"/articles/{index}", json=self._article_body(title),
+                            headers={"Authorization": f"Bearer {self.tokens[user]}"})
+
+    async def upload(self, client):
+        filename = f"loadtest-{self.run_id}-{uuid.uuid4().hex[:8]}.bin"
+        response = await self._request(client, "POST /upload/", "POST", "/upload/",
+                                       files={"file": (filename, os.urandom(self.upload_size))})
+        if response is not None and response.status_code == 200:
+            self.uploaded.append(filename)
+
+    async def download(self, client):
+        if not self.uploaded:
+            return await self.upload(client)
+        await self._request(client, "GET /download/{filename}", "GET", f"/download/{random.choice(self.uploaded)}")
+
+    async def subscribe(self, ready: asyncio.Event, stop: asyncio.Event) -> None:
+        url = "ws" + self.base_url[len("http"):] + "/ws"
+        try:
+            async with websockets.connect(url, max_size=None) as connection:
+                ready.set()
+                while not stop.is_set():
+                    try:
+                        message = json.loads(await asyncio.wait_for(connection.recv(), 0.5))
+                    except asyncio.TimeoutError:
+                        continue
+                    received = time.perf_counter()
+                    if message.get("type") in WRITE_MESSAGES:
+                        sent = self.sent_writes.get((message.get("data") or {}).get("title"))
+                        if sent is not None:
+                            self.broadcasts.record(received - sent, 200)
+        except (OSError, websockets.WebSocketException) as e:
+            self.broadcasts.record(0.0, type(e).__name__)
+            ready.set()
+
+    async def _run_operation(self, client, operation: str) -> None:
+        try:
+            await getattr(self, operation)(client)
+        finally:
+            self.in_flight -= 1
+
+    async def run(self) -> dict:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            await self.setup(client)
+
+            stop = asyncio.Event()
+            subscribers = []
+            for _ in range(self.subscribers):
+                ready = asyncio.Event()
+                subscribers.append(asyncio.create_task(self.subscribe(ready, stop)))
+                await ready.wait()
+
+            operations, weights = list(self.mix), list(self.mix.values())
+            tasks = set()
+            started = time.perf_counter()
+            next_at = started
+            while True:
+                next_at += random.expovariate(self.rate)
+                if next_at - started >= self.duration:
+                    break
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                if self.in_flight >= self.concurrency:
+                    self.dropped += 1
+                    continue
+                self.in_flight += 1
+                task = asyncio.create_task(self._run_operation(client, random.choices(operations, weights)[0]))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            # Broadcasts are sent after the write's response, so give the last ones a moment to arrive.
+            await asyncio.sleep(1.0 if subscribers else 0.0)
+            stop.set()
+            await asyncio.gather(*subscribers)
+
+            if self.cleanup:
+                await self._clean_up(client)
+        return self.report(elapsed)
+
+    async def _clean_up(self, client: httpx.AsyncClient) -> None:
+        for user, index in self.created:
+            await client.delete(f"/articles/{index}", headers={"Authorization": f"Bearer {self.tokens[user]}"})
+        for filename in self.uploaded:
+            await client.delete(f"/api/files/{filename}")
+
+    def report(self, elapsed: float) -> dict:
+        routes = {route: stats.summary(elapsed) for route, stats in sorted(self.stats.items())}
+        total = sum(summary["requests"] for summary in routes.values())
+        writes = sum(
+            summary["statuses"].get("200", 0)
+            for route, summary in routes.items() if route in ("POST /add_article", "PUT /articles/{id}")
+        )
+        broadcasts = self.broadcasts.summary(elapsed)
+        broadcasts["expected"] = writes * self.subscribers
+        return {
+            "base_url": self.base_url,
+            "target_rate": self.rate,
+            "elapsed_seconds": elapsed,
+            "requests": total,
+            "throughput": total / elapsed if elapsed else 0.0,
+            "errors": sum(summary["errors"] for summary in routes.values()),
+            "dropped": self.dropped,
+            "subscribers": self.subscribers,
+            "routes": routes,
+            "broadcasts": broadcasts
+        }
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed_seconds']:.1f}s: {report['throughput']:.1f} req/s "
+        f"(target {report['target_rate']:.1f}), {report['errors']} errors, {report['dropped']} dropped by the client"
+    )
+    header = f"{'route':<28}{'req':>7}{'req/s':>9}{'err %':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["routes"].items())
+    if report["subscribers"]:
+        rows.append((f"ws broadcast x{report['subscribers']}", report["broadcasts"]))
+    for route, summary in rows:
+        print(
+            f"{route:<28}{summary['requests']:>7}{summary['throughput']:>9.1f}{summary['error_rate'] * 100:>8.1f}"
+            f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}{summary['max_ms']:>9.1f}"
+        )
+        failures = {status: number for status, number in summary["statuses"].items() if status != "200"}
+        if failures:
+            print(f"{'':<28}statuses: {', '.join(f'{status}={number}' for status, number in failures.items())}")
+    if report["subscribers"]:
+        broadcasts = report["broadcasts"]
+        print(f"broadcasts delivered: {broadcasts['requests'] - broadcasts['errors']} of {broadcasts['expected']} expected")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive a running instance with a mix of HTTP requests and /ws subscribers")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rate", type=float, default=20.0, help="requests started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation=weight pairs, default {DEFAULT_MIX}")
+    parser.add_argument("--users", type=int, default=4, help="accounts the writes are spread over")
+    parser.add_argument("--subscribers", type=int, default=0, help="concurrent /ws connections")
+    parser.add_argument("--concurrency", type=int, default=256, help="maximum requests in flight")
+    parser.add_argument("--upload-size", type=int, default=64 * 1024, help="bytes per uploaded file")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--keep", action="store_true", help="keep the articles and files created by the run")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    load_test = LoadTest(
+        args.url,
+        args.rate,
+        args.duration,
+        parse_mix(args.mix),
+        args.users,
+        args.subscribers,
+        args.concurrency,
+        args.upload_size,
+        args.timeout,
+        not args.keep
+    )
+    report = asyncio.run(load_test.run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
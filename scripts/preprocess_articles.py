@@ -0,0 +1,59 @@
+import argparse
+import glob
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.preprocessing_pipeline import PreprocessingPipeline
+
+def input_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                name for pattern in ("*.json", "*.jsonl", "*.ndjson") for name in glob.glob(os.path.join(path, pattern))
+            ))
+        else:
+            files.append(path)
+    return files
+
+def preprocess_articles(inputs, work_dir, output_dir, workers=1, batch_size=64, shard_size=10000, formats=("ndjson",),
+                        relayout=False):
+    pipeline = PreprocessingPipeline(
+        work_dir,
+        output_dir,
+        workers=workers,
+        batch_size=batch_size,
+        shard_size=shard_size,
+        formats=formats,
+        relayout=relayout
+    )
+    started = time.perf_counter()
+    count = pipeline.run(input_files(inputs))
+    print(f"Preprocessed {count} articles in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Clean raw arXiv metadata, embed the abstracts and lay them out in 2D for import_articles.py"
+    )
+    parser.add_argument("inputs", nargs="+", help="JSON / JSON-lines files, or directories of them")
+    parser.add_argument("--work-dir", default="data/work", help="checkpoints and the embedding cache")
+    parser.add_argument("--output-dir", default="data/processed")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="encoder processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="abstracts per model call")
+    parser.add_argument("--shard-size", type=int, default=10000, help="articles per output file")
+    parser.add_argument("--format", choices=("ndjson", "parquet", "both"), default="ndjson")
+    parser.add_argument("--relayout", action="store_true", help="recompute t-SNE instead of placing new articles")
+    args = parser.parse_args()
+    preprocess_articles(
+        args.inputs,
+        args.work_dir,
+        args.output_dir,
+        args.workers,
+        args.batch_size,
+        args.shard_size,
+        ("ndjson", "parquet") if args.format == "both" else (args.format,),
+        args.relayout
+    )
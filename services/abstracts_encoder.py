@@ -1,25 +1,62 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.manifold import TSNE
+import threading
+import time
 
 class AbstractsEncoder:
+    # sentence_transformers and scikit-learn take seconds and hundreds of MB to
+    # import, so they are only imported when the model or t-SNE is first used.
     def __init__(self):
         self._model = None
         self._tsne = None
+        # Warm-up and the enrichment threads may all ask for the model at once; only one loads it.
+        self._load_lock = threading.Lock()
+        self.warmup_seconds = None
         
     @property
     def model(self):
         if self._model is None:
-            self._model = SentenceTransformer('all-MiniLM-L6-v2')
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer('all-MiniLM-L6-v2')
         return self._model
     
     @property
     def tsne(self):
         if self._tsne is None:
-            self._tsne = TSNE(n_components=2, random_state=42, perplexity=30)
+            with self._load_lock:
+                if self._tsne is None:
+                    from sklearn.manifold import TSNE
+                    self._tsne = TSNE(n_components=2, random_state=42, perplexity=30)
         return self._tsne
 
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self):
+        """Load the model and run one encoding so the first real request does not pay for it"""
+        started = time.perf_counter()
+        self.encode("warm-up")
+        self.warmup_seconds = time.perf_counter() - started
+
     def encode(self, abstract: str) -> list[float]:
         return self.model.encode(abstract).tolist()
 
+    def encode_batch(self, abstracts: list[str], batch_size: int = 32) -> list[list[float]]:
+        return self.model.encode(abstracts, batch_size=batch_size).tolist()
+
     def get_coordinates(self, embedding: list[float]) -> list[float]:
         return self.tsne.fit_transform([embedding]).tolist()[0]
+
+    def get_layout(self, embeddings):
+        """2D t-SNE layout of a whole corpus, one (x, y) row per embedding"""
+        import numpy as np
+
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if len(matrix) < 2:
+            return np.zeros((len(matrix), 2))
+        if len(matrix) <= self.tsne.perplexity:
+            # t-SNE needs more points than its perplexity; tiny corpora get a smaller one.
+            from sklearn.manifold import TSNE
+            return TSNE(n_components=2, random_state=42, perplexity=len(matrix) - 1).fit_transform(matrix)
+        return self.tsne.fit_transform(matrix)
@@ -0,0 +1,197 @@
+import asyncio
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class CostClass:
+    """A concurrency limit with a bounded wait queue, shared by a group of routes.
+
+    Requests over `limit` wait in FIFO order for at most `queue_timeout`
+    seconds; when `queue_size` requests are already waiting, new ones are
+    rejected straight away. Runs on the event loop, so no locking is needed.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.rejections = 0
+        self.timeouts = 0
+        self.average_seconds = 0.1
+        self._waiters: deque = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.rejections += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # The slot was handed over just as the wait expired; keep it.
+                return True
+            self._waiters.remove(waiter)
+            waiter.cancel()
+            self.timeouts += 1
+            self.rejections += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, seconds: Optional[float] = None) -> None:
+        if seconds is not None:
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter, so `active` stays the same.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new request has likely drained"""
+        backlog = (self.queue_depth + self.active) / max(self.limit, 1)
+        return max(1, math.ceil(backlog * self.average_seconds))
+
+
+class AdmissionController:
+    """Assigns requests to cost classes by path and admits them through that class.
+
+    A route is a path, optionally preceded by an HTTP method (`"PUT /articles/{}"`).
+    `{}` matches one path segment, and a route ending in `/` matches by
+    prefix; full matches are tried before prefixes. Exempt paths (health
+    checks, metrics) are never limited.
+    """
+
+    def __init__(self, classes: Iterable[CostClass], routes: Dict[str, str], default: str,
+                 exempt: Iterable[str] = ()):
+        self.classes = {cost_class.name: cost_class for cost_class in classes}
+        self.routes = routes
+        self.default = default
+        self.exempt = set(exempt)
+        self._patterns = sorted(
+            (self._compile(route) + (name,) for route, name in routes.items()),
+            key=lambda pattern: pattern[2]
+        )
+
+    @staticmethod
+    def _compile(route: str) -> Tuple[Optional[str], re.Pattern, bool]:
+        method, _, path = route.rpartition(" ")
+        prefix = path.endswith("/")
+        regex = "/".join("[^/]+" if part == "{}" else re.escape(part) for part in path.split("/"))
+        return method or None, re.compile(regex if prefix else regex + "$"), prefix
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        def cost_class(name: str, limit: int, queue_size: int, queue_timeout: float) -> CostClass:
+            prefix = f"ADMISSION_{name.upper()}"
+            return CostClass(
+                name,
+                int(os.environ.get(f"{prefix}_LIMIT", limit)),
+                int(os.environ.get(f"{prefix}_QUEUE", queue_size)),
+                float(os.environ.get(f"{prefix}_QUEUE_TIMEOUT", queue_timeout))
+            )
+
+        return cls(
+            [
+                cost_class("heavy", 4, 16, 2.0),
+                # Streams hold their slot until the last byte is sent, so they do not share the heavy slots.
+                cost_class("export", 2, 4, 2.0),
+                cost_class("auth", 4, 32, 5.0),
+                cost_class("default", 64, 256, 5.0),
+            ],
+            routes={
+                "/all_articles": "heavy",
+                "/search": "heavy",
+                "/sorted_articles": "heavy",
+                "/articles_by_year": "heavy",
+                "/stats/facets": "heavy",
+                "/export": "export",
+                # These scan every article to find one.
+                "/article/{}": "heavy",
+                "POST /add_article": "heavy",
+                "PUT /articles/{}": "heavy",
+                "DELETE /articles/{}": "heavy",
+                # bcrypt
+                "/token": "auth",
+                "/register": "auth",
+            },
+            default="default",
+            exempt=("/health", "/metrics")
+        )
+
+    def classify(self, path: str, method: str = "GET") -> Optional[CostClass]:
+        if path in self.exempt:
+            return None
+        name = next(
+            (
+                name for route_method, pattern, _, name in self._patterns
+                if route_method in (None, method) and pattern.match(path)
+            ),
+            self.default
+        )
+        return self.classes[name]
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.rejections = 0
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TokenBucketLimiter":
+        return cls(
+            float(os.environ.get("USER_RATE_LIMIT_PER_SECOND", "5")),
+            float(os.environ.get("USER_RATE_LIMIT_BURST", "20"))
+        )
+
+    def acquire(self, key: str) -> float:
+        """Take a token for `key`; returns 0 when allowed, otherwise the seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                if len(self._buckets) > self.max_keys:
+                    self._drop_full(now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            self.rejections += 1
+            return (1 - tokens) / self.rate
+
+    def _drop_full(self, now: float) -> None:
+        # A bucket that has refilled completely behaves exactly like a missing one.
+        refill_seconds = self.burst / self.rate
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated >= refill_seconds:
+                del self._buckets[key]
@@ -0,0 +1,188 @@
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.knn_service import normalize_rows
+
+DTYPES = {"int8": np.int8, "float16": np.float16}
+VECTORS_FILE = "vectors.bin"
+IDS_FILE = "ids.npy"
+SCALES_FILE = "scales.npy"
+META_FILE = "meta.json"
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """L2-normalize rows and quantize them; returns (vectors, per-row scales).
+
+    int8 uses a symmetric per-vector scale (max |value| maps to 127); float16
+    keeps the normalized values and a scale of 1.
+    """
+    matrix = normalize_rows(np.asarray(matrix, dtype=np.float32))
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    vectors = np.clip(np.rint(matrix / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+    return vectors, scales.astype(np.float32)
+
+
+def write_snapshot(path: str, chunks: Iterable[Sequence[Tuple[int, Sequence[float]]]], dtype: str = "int8") -> int:
+    """Write (id, embedding) rows, given in ascending id order, as a snapshot directory.
+
+    Rows are consumed chunk by chunk so the corpus is never held as Python
+    lists. Rows whose dimension differs from the first one are skipped.
+    Each export goes to its own `<path>.<timestamp>` directory and `path` is
+    a symlink that is switched to it in one atomic rename, so a reader that
+    resolves `path` once always opens files of a single export. The previous
+    export is kept for readers still opening it; older ones are removed.
+    Returns the number of vectors written.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+
+    path = os.path.abspath(path)
+    staging = f"{path}.{time.time_ns()}"
+    os.makedirs(staging)
+
+    dimension = None
+    ids, scales = [], []
+    with open(os.path.join(staging, VECTORS_FILE), "wb") as vectors_file:
+        for chunk in chunks:
+            if dimension is None and chunk:
+                dimension = len(chunk[0][1])
+            kept = [(article_id, embedding) for article_id, embedding in chunk if len(embedding) == dimension]
+            if not kept:
+                continue
+            vectors, chunk_scales = quantize([embedding for _, embedding in kept], dtype)
+            vectors_file.write(vectors.tobytes())
+            ids.append(np.fromiter((article_id for article_id, _ in kept), dtype=np.int64, count=len(kept)))
+            scales.append(chunk_scales)
+
+    ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+    np.save(os.path.join(staging, IDS_FILE), ids)
+    np.save(os.path.join(staging, SCALES_FILE), np.concatenate(scales) if scales else np.empty(0, dtype=np.float32))
+    with open(os.path.join(staging, META_FILE), "w") as meta_file:
+        json.dump({"dtype": dtype, "count": len(ids), "dimension": dimension or 0}, meta_file)
+
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A snapshot written before exports were versioned.
+        shutil.rmtree(path)
+    link = f"{path}.link"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(staging), link)
+    os.replace(link, path)
+
+    for version in glob.glob(f"{glob.escape(path)}.[0-9]*"):
+        if version not in (staging, previous):
+            shutil.rmtree(version, ignore_errors=True)
+    return len(ids)
+
+
+class EmbeddingSnapshot:
+    """Read-only, memory-mapped view of a snapshot written by `write_snapshot`.
+
+    Vectors are mapped rather than loaded, so every process that opens the
+    same snapshot shares one copy in the OS page cache. Queries scan the
+    mapping one block at a time; an int8 corpus takes a quarter of the
+    memory of float32 (plus 12 bytes per article for id and scale).
+
+    Instances are immutable: `path` is resolved once and every file is read
+    from that export, so reloading means opening a new instance and
+    swapping the reference to it.
+    """
+
+    def __init__(self, path: str, block_size: int = 16384):
+        source = os.path.realpath(path)
+        with open(os.path.join(source, META_FILE)) as meta_file:
+            meta = json.load(meta_file)
+        ids = np.load(os.path.join(source, IDS_FILE), mmap_mode="r")
+        scales = np.load(os.path.join(source, SCALES_FILE), mmap_mode="r")
+        if meta["count"]:
+            vectors = np.memmap(
+                os.path.join(source, VECTORS_FILE),
+                dtype=DTYPES[meta["dtype"]],
+                mode="r",
+                shape=(meta["count"], meta["dimension"])
+            )
+        else:
+            vectors = np.empty((0, meta["dimension"]), dtype=DTYPES[meta["dtype"]])
+
+        for name, value in (
+            ("path", path), ("source", source), ("dtype", meta["dtype"]), ("dimension", meta["dimension"]),
+            ("block_size", block_size), ("ids", ids), ("scales", scales), ("vectors", vectors)
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("EmbeddingSnapshot is immutable; open a new one instead")
+
+    def is_current(self) -> bool:
+        """Whether `path` still points at the export this snapshot was opened from"""
+        return os.path.realpath(self.path) == self.source
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position_of(self, article_id: int) -> Optional[int]:
+        position = int(np.searchsorted(self.ids, article_id))
+        if position < len(self.ids) and self.ids[position] == article_id:
+            return position
+        return None
+
+    def vector(self, article_id: int) -> Optional[np.ndarray]:
+        """Dequantized, normalized float32 vector of an article, if it is in the snapshot"""
+        position = self.position_of(article_id)
+        if position is None:
+            return None
+        return self.vectors[position].astype(np.float32) * self.scales[position]
+
+    def search(self, query: Sequence[float], k: int = 10, exclude_id: Optional[int] = None,
+               candidates: Optional[int] = None,
+               rerank: Optional[Callable[[List[int]], List[tuple]]] = None) -> List[Tuple[int, float]]:
+        """Top-k (article id, cosine similarity) pairs for `query`, best first.
+
+        With `rerank`, the best `candidates` (default 4 * k) approximate
+        matches are rescored exactly against the float32 embeddings that
+        `rerank(ids)` returns as (id, embedding) rows.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if len(self) == 0 or query.shape != (self.dimension,):
+            return []
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        wanted = max(k, candidates or (4 * k if rerank else k))
+        exclude = self.position_of(exclude_id) if exclude_id is not None else None
+        best_positions = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(self), self.block_size):
+            stop = min(start + self.block_size, len(self))
+            scores = (self.vectors[start:stop].astype(np.float32) @ query) * self.scales[start:stop]
+            if exclude is not None and start <= exclude < stop:
+                scores[exclude - start] = -np.inf
+            best_positions = np.concatenate([best_positions, np.arange(start, stop)])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > wanted:
+                top = np.argpartition(-best_scores, wanted - 1)[:wanted]
+                best_positions, best_scores = best_positions[top], best_scores[top]
+
+        keep = np.isfinite(best_scores)
+        candidate_ids = self.ids[best_positions[keep]].tolist()
+        candidate_scores = best_scores[keep].tolist()
+
+        if rerank and candidate_ids:
+            rows = [(article_id, embedding) for article_id, embedding in rerank(candidate_ids) if len(embedding) == self.dimension]
+            if rows:
+                exact = normalize_rows(np.array([embedding for _, embedding in rows], dtype=np.float32)) @ query
+                candidate_ids = [article_id for article_id, _ in rows]
+                candidate_scores = exact.tolist()
+
+        ranked = sorted(zip(candidate_ids, candidate_scores), key=lambda pair: (-pair[1], pair[0]))
+        return [(int(article_id), float(score)) for article_id, score in ranked[:k]]
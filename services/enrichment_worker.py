@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import timedelta
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from data.domain import Article
+from datalink.routing import primary_reads
+from repository.repository import Repository
+from services.abstracts_encoder import AbstractsEncoder
+from services.knn_service import project_coordinates
+
+
+class EnrichmentWorker:
+    """Thread pool that drains the enrichment_jobs table.
+
+    Each thread claims a batch of due jobs, encodes their abstracts in one
+    model call, places them on the map and stores the results in a single
+    transaction. Failed batches are retried with a linear backoff until
+    `max_attempts`, after which the job and its article are marked failed.
+    The model releases the GIL while encoding, so threads are enough.
+    """
+
+    def __init__(self, repository: Repository, encoder: AbstractsEncoder,
+                 on_enriched: Optional[Callable[[List[Article]], None]] = None, workers: int = 1,
+                 batch_size: int = 32, poll_interval: float = 1.0, max_attempts: int = 3,
+                 backoff: timedelta = timedelta(seconds=30), lease: timedelta = timedelta(minutes=10),
+                 reference_size: int = 20000, reference_ttl: float = 300.0):
+        self.repository = repository
+        self.encoder = encoder
+        self.on_enriched = on_enriched
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.reference_size = reference_size
+        self.reference_ttl = reference_ttl
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._reference_lock = threading.Lock()
+        self._reference = None
+        self._reference_loaded_at = 0.0
+
+    def start(self) -> None:
+        self._stop.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"enrichment-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self) -> int:
+        """Claim and process one batch; returns the number of jobs claimed"""
+        jobs = self.repository.claim_enrichment_jobs(self.batch_size, self.lease)
+        if jobs:
+            self._process(jobs)
+        return len(jobs)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"Enrichment worker error: {e}")
+                claimed = 0
+            if not claimed:
+                self._stop.wait(self.poll_interval)
+
+    def _process(self, jobs: List[tuple]) -> None:
+        job_ids = [job_id for job_id, _, _, _ in jobs]
+        try:
+            embeddings = np.asarray(
+                self.encoder.encode_batch([abstract for _, _, _, abstract in jobs], batch_size=self.batch_size),
+                dtype=np.float64
+            )
+            coordinates = project_coordinates(embeddings, *self._layout_reference())
+            results = [
+                (job_id, article_id, embedding, float(x), float(y))
+                for (job_id, article_id, _, _), embedding, (x, y) in zip(jobs, embeddings.tolist(), coordinates.tolist())
+            ]
+            articles = self.repository.complete_enrichment_jobs(results)
+        except Exception as e:
+            print(f"Enrichment of jobs {job_ids} failed: {e}")
+            self.repository.fail_enrichment_jobs(job_ids, str(e), self.max_attempts, self.backoff)
+            return
+
+        if self.on_enriched:
+            self.on_enriched(articles)
+
+    def _layout_reference(self):
+        with self._reference_lock:
+            if self._reference is None or time.monotonic() - self._reference_loaded_at > self.reference_ttl:
+                with primary_reads():
+                    rows = self.repository.get_layout_reference(self.reference_size)
+                dimension = len(rows[0][0]) if rows else 0
+                rows = [row for row in rows if len(row[0]) == dimension]
+                self._reference = (
+                    np.array([embedding for embedding, _, _ in rows], dtype=np.float64).reshape(len(rows), dimension),
+                    np.array([(x, y) for _, x, y in rows], dtype=np.float64).reshape(len(rows), 2)
+                )
+                self._reference_loaded_at = time.monotonic()
+            return self._reference
@@ -0,0 +1,156 @@
+import io
+import json
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from datalink.data_link import EXPORT_COLUMNS
+
+FORMATS = ("parquet", "arrow", "ndjson")
+MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "ndjson": "application/x-ndjson",
+}
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrows", "ndjson": "ndjson"}
+
+
+def parse_columns(columns: Optional[str]) -> List[str]:
+    """Comma-separated column names, in export order; all columns when empty"""
+    if not columns:
+        return list(EXPORT_COLUMNS)
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands its bytes out on `drain` but keeps counting positions.
+
+    Parquet footers record absolute offsets, so `tell` must keep growing
+    after earlier bytes have been sent.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+    """Turns chunks of article rows into an ndjson, Arrow IPC stream or Parquet byte stream.
+
+    Every chunk is encoded and handed out as soon as it arrives (one Arrow
+    record batch or one Parquet row group per chunk), so memory stays
+    bounded by the chunk size whatever the size of the corpus. Embeddings
+    are written as a fixed-size float32 list; rows whose embedding is
+    missing or has another length get a null. When no article has an
+    embedding yet (dimension 0) the column is an all-null float32 list.
+    """
+
+    def __init__(self, format: str, columns: Sequence[str], embedding_dimension: int = 0):
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported export format: {format}")
+        self.format = format
+        self.columns = list(columns)
+        self.embedding_dimension = embedding_dimension
+        if format != "ndjson":
+            # pyarrow is only needed for the columnar formats; fail before any output is produced.
+            import pyarrow  # noqa: F401
+
+    def stream(self, chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+        if self.format == "ndjson":
+            return self._stream_ndjson(chunks)
+        return self._stream_columnar(chunks)
+
+    def _stream_ndjson(self, chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+        for chunk in chunks:
+            if chunk:
+                yield "".join(json.dumps(dict(zip(self.columns, row))) + "\n" for row in chunk).encode()
+
+    def _stream_columnar(self, chunks: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column, self._arrow_type(column)) for column in self.columns])
+        sink = _ChunkSink()
+        if self.format == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+            write = lambda batch: writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+            write = writer.write_batch
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            write(self._record_batch(chunk, schema))
+            yield sink.drain()
+
+        writer.close()
+        yield sink.drain()
+
+    def _record_batch(self, chunk: Sequence[tuple], schema):
+        import pyarrow as pa
+
+        arrays = []
+        for position, column in enumerate(self.columns):
+            values = [row[position] for row in chunk]
+            if column == "embeddings":
+                arrays.append(self._embedding_array(values))
+            else:
+                arrays.append(pa.array(values, type=schema.field(column).type))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def _embedding_array(self, embeddings: List[Optional[list]]):
+        import pyarrow as pa
+
+        dimension = self.embedding_dimension
+        if dimension <= 0:
+            # Arrow has no zero-size fixed lists.
+            return pa.nulls(len(embeddings), type=pa.list_(pa.float32()))
+        present = np.fromiter(
+            (embedding is not None and len(embedding) == dimension for embedding in embeddings),
+            dtype=bool,
+            count=len(embeddings)
+        )
+        values = np.zeros((len(embeddings), dimension), dtype=np.float32)
+        if present.any():
+            values[present] = np.array([embedding for embedding, ok in zip(embeddings, present) if ok], dtype=np.float32)
+        return pa.FixedSizeListArray.from_arrays(
+            pa.array(values.ravel()),
+            dimension,
+            mask=pa.array(~present)
+        )
+
+    def _arrow_type(self, column: str):
+        import pyarrow as pa
+
+        if column == "embeddings":
+            if self.embedding_dimension <= 0:
+                return pa.list_(pa.float32())
+            return pa.list_(pa.float32(), self.embedding_dimension)
+        if column in ("index", "user_id", "year", "citations"):
+            return pa.int32()
+        if column in ("coordinate_x", "coordinate_y"):
+            return pa.float64()
+        return pa.string()
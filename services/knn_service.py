@@ -0,0 +1,230 @@
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def embedding_matrix(rows: Sequence[Tuple[int, Sequence[float]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stack (id, embedding) rows into an id vector and an L2-normalized float32 matrix.
+
+    Rows without an embedding, or whose dimension differs from the most common
+    one, are left out.
+    """
+    dimensions = Counter(len(embedding) for _, embedding in rows if embedding)
+    if not dimensions:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    dimension = dimensions.most_common(1)[0][0]
+    kept = [(article_id, embedding) for article_id, embedding in rows if embedding and len(embedding) == dimension]
+    ids = np.fromiter((article_id for article_id, _ in kept), dtype=np.int64, count=len(kept))
+    matrix = np.array([embedding for _, embedding in kept], dtype=np.float32)
+    return ids, normalize_rows(matrix)
+
+
+def stream_embedding_matrix(chunks: Iterable[Sequence[Tuple[int, Sequence[float]]]]) -> Tuple[np.ndarray, np.ndarray]:
+    """`embedding_matrix` over chunks of rows, such as `Repository.iter_embeddings`.
+
+    Each chunk is converted to float32 as it arrives, so the Python lists of
+    only one chunk are alive at a time.
+    """
+    parts = {}
+    for chunk in chunks:
+        by_dimension = {}
+        for article_id, embedding in chunk:
+            if embedding:
+                by_dimension.setdefault(len(embedding), []).append((article_id, embedding))
+        for dimension, rows in by_dimension.items():
+            parts.setdefault(dimension, []).append((
+                np.fromiter((article_id for article_id, _ in rows), dtype=np.int64, count=len(rows)),
+                normalize_rows(np.array([embedding for _, embedding in rows], dtype=np.float32))
+            ))
+    if not parts:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    kept = max(parts.values(), key=lambda dimension_parts: sum(len(ids) for ids, _ in dimension_parts))
+    ids = np.concatenate([ids for ids, _ in kept])
+    matrix = kept[0][1] if len(kept) == 1 else np.concatenate([matrix for _, matrix in kept])
+    return ids, matrix
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def project_coordinates(embeddings: np.ndarray, reference_embeddings: np.ndarray,
+                        reference_coordinates: np.ndarray, k: int = 5) -> np.ndarray:
+    """Place new embeddings on the existing 2D map at the similarity-weighted mean of their k nearest articles.
+
+    t-SNE cannot embed single points into an existing layout, so new articles
+    are interpolated from already placed ones instead.
+    """
+    if len(reference_embeddings) == 0 or reference_embeddings.shape[1] != embeddings.shape[1]:
+        return np.zeros((len(embeddings), 2))
+
+    k = min(k, len(reference_embeddings))
+    similarities = normalize_rows(embeddings) @ normalize_rows(reference_embeddings).T
+    nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    weights = np.clip(np.take_along_axis(similarities, nearest, axis=1), 0.0, None) + 1e-6
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.einsum("nk,nkd->nd", weights, reference_coordinates[nearest])
+
+
+class EmbeddingIndex:
+    """Normalized embeddings of the corpus held in memory and updated one article at a time.
+
+    Rows live in arrays with spare capacity, so adding an article is
+    amortized O(dimension) and removing one moves the last row into its
+    place. Per article it also tracks the size and lowest score of its
+    stored neighbour list, which decide whether a new article enters it.
+    `version` is the change log version the index is current with. A
+    float32 `matrix` of at least 16 rows is taken over rather than copied.
+    """
+
+    def __init__(self, ids: np.ndarray, matrix: np.ndarray, floors: dict, version: int):
+        self.version = version
+        self.dimension = matrix.shape[1] if len(ids) else 0
+        self.size = len(ids)
+        capacity = max(16, self.size)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        if capacity == self.size and matrix.dtype == np.float32 and matrix.flags.c_contiguous:
+            self._matrix = matrix
+        else:
+            self._matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        self._floors = np.full(capacity, -np.inf, dtype=np.float32)
+        self._ids[:self.size] = ids
+        if self._matrix is not matrix:
+            self._matrix[:self.size] = matrix
+        self.positions = {article_id: position for position, article_id in enumerate(ids.tolist())}
+        for article_id, (count, floor) in floors.items():
+            if article_id in self.positions:
+                self._counts[self.positions[article_id]] = count
+                self._floors[self.positions[article_id]] = floor
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self.size]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[:self.size]
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts[:self.size]
+
+    @property
+    def floors(self) -> np.ndarray:
+        return self._floors[:self.size]
+
+    def upsert(self, article_id: int, embedding: Sequence[float]) -> None:
+        """Add or replace an article's vector; embeddings of another dimension are treated as missing"""
+        if not self.size and embedding:
+            self.dimension = len(embedding)
+            self._matrix = np.zeros((len(self._ids), self.dimension), dtype=np.float32)
+        if not embedding or len(embedding) != self.dimension:
+            self.remove(article_id)
+            return
+
+        position = self.positions.get(article_id)
+        if position is None:
+            if self.size == len(self._ids):
+                self._grow()
+            position = self.positions[article_id] = self.size
+            self._ids[position] = article_id
+            self._counts[position] = 0
+            self._floors[position] = -np.inf
+            self.size += 1
+        self._matrix[position] = normalize_rows(np.asarray([embedding], dtype=np.float32))[0]
+
+    def remove(self, article_id: int) -> None:
+        position = self.positions.pop(article_id, None)
+        if position is None:
+            return
+        last = self.size - 1
+        if position != last:
+            moved = int(self._ids[last])
+            for array in (self._ids, self._matrix, self._counts, self._floors):
+                array[position] = array[last]
+            self.positions[moved] = position
+        self.size = last
+
+    def set_neighbours(self, article_id: int, neighbours: List[Tuple[int, float]]) -> None:
+        position = self.positions.get(article_id)
+        if position is not None:
+            self._counts[position] = len(neighbours)
+            self._floors[position] = min((score for _, score in neighbours), default=-np.inf)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._ids)
+        self._ids = np.resize(self._ids, capacity)
+        self._counts = np.resize(self._counts, capacity)
+        self._floors = np.resize(self._floors, capacity)
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        self._matrix = matrix
+
+
+class KnnGraphBuilder:
+    """Exact cosine k-nearest-neighbour graph over article embeddings.
+
+    Similarities are computed one block of rows at a time (block @ matrix.T),
+    so memory stays at block_size x N scores. Blocks run on a thread pool:
+    numpy releases the GIL inside matrix multiplies, so they use all cores.
+    """
+
+    def __init__(self, k: int = 10, block_size: int = 1024, workers: Optional[int] = None):
+        self.k = k
+        self.block_size = block_size
+        self.workers = workers or os.cpu_count() or 1
+
+    def build(self, ids: np.ndarray, matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (neighbour ids, scores), each of shape (N, min(k, N - 1)), best first."""
+        count = len(ids)
+        k = min(self.k, count - 1)
+        if k <= 0:
+            return np.empty((count, 0), dtype=np.int64), np.empty((count, 0), dtype=np.float32)
+
+        neighbour_ids = np.empty((count, k), dtype=np.int64)
+        neighbour_scores = np.empty((count, k), dtype=np.float32)
+
+        def run_block(start: int) -> None:
+            stop = min(start + self.block_size, count)
+            scores = matrix[start:stop] @ matrix.T
+            scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            top, top_scores = self._top_k(scores, k)
+            neighbour_ids[start:stop] = ids[top]
+            neighbour_scores[start:stop] = top_scores
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(run_block, range(0, count, self.block_size)))
+
+        return neighbour_ids, neighbour_scores
+
+    def neighbours_of(self, vector: np.ndarray, ids: np.ndarray, matrix: np.ndarray,
+                      exclude_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Top-k neighbours of one vector, plus its similarity to every row of `matrix`."""
+        similarities = matrix @ vector
+        similarities[ids == exclude_id] = -np.inf
+        k = min(self.k, int(np.sum(ids != exclude_id)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), similarities
+        top, top_scores = self._top_k(similarities[np.newaxis, :], k)
+        return ids[top[0]], top_scores[0], similarities
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def merge(self, neighbours: List[Tuple[int, float]], candidate: Tuple[int, float]) -> List[Tuple[int, float]]:
+        """Insert `candidate` into a best-first neighbour list, keeping at most k entries."""
+        merged = [entry for entry in neighbours if entry[0] != candidate[0]] + [candidate]
+        merged.sort(key=lambda entry: -entry[1])
+        return merged[:self.k]
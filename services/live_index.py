@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+
+class LiveIndex:
+    """In-memory index that is rebuilt from the database while writes keep arriving.
+
+    A rebuild loads a snapshot and builds new state without holding the
+    lock, replays the upserts and removes that arrived meanwhile, then swaps
+    the new state in. Rebuilds are serialized: a caller that finds one in
+    flight waits for it and returns instead of starting another.
+
+    `sync` keeps the index current with the change log, so writes from
+    other processes and bulk imports show up too; `version` is the change
+    log version the index is current with.
+
+    Subclasses implement `_build`, `_install`, `_upsert` and `_remove`;
+    the last three are called with `_lock` held.
+    """
+    SYNC_SECONDS = 1.0
+    # More changes than this are cheaper to load with a rebuild than to replay.
+    REPLAY_LIMIT = 5000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._built = False
+        self._rebuilds = 0
+        self._pending: Optional[list] = None
+        self._synced_at = 0.0
+        self.version = 0
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def rebuild(self, load: Callable[[], Iterable], version: Callable[[], int] = None) -> None:
+        """Rebuild from `load()`; writes arriving meanwhile are replayed before the swap.
+
+        `version()`, read before loading, becomes the change log version the
+        new state is current with.
+        """
+        in_flight = self._rebuild_lock.locked()
+        completed = self._rebuilds
+        with self._rebuild_lock:
+            if in_flight and self._rebuilds > completed:
+                return
+
+            with self._lock:
+                self._pending = []
+            try:
+                # Read before the items, so replaying the log from it can only repeat changes, never miss one.
+                loaded_version = version() if version else self.version
+                state = self._build(load())
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+
+            with self._lock:
+                self._install(state)
+                self.version = loaded_version
+                for operation, payload in self._pending:
+                    if operation == "upsert":
+                        self._upsert(payload)
+                    else:
+                        self._remove(payload)
+                self._pending = None
+                self._built = True
+                self._rebuilds += 1
+
+    def sync(self, version: Callable[[], int], changes: Callable[[int, int], dict], load: Callable[[], Iterable],
+             item: Callable[[object], object]) -> None:
+        """Catch up with the change log, at most once every SYNC_SECONDS.
+
+        Replays the changes after `version` through `item(article)`, or
+        rebuilds from `load()` when the index was never built or more than
+        REPLAY_LIMIT changes have piled up, as after a bulk import.
+        """
+        if self._built and time.monotonic() - self._synced_at < self.SYNC_SECONDS:
+            return
+
+        with self._rebuild_lock:
+            if self._built and time.monotonic() - self._synced_at < self.SYNC_SECONDS:
+                return
+            latest = version()
+            if self._built and latest - self.version <= self.REPLAY_LIMIT:
+                since = self.version
+                while since < latest:
+                    page = changes(since, 500)
+                    for change in page["changes"]:
+                        if change["operation"] == "delete":
+                            self.remove(change["article_id"])
+                        else:
+                            self.upsert(item(change["article"]))
+                    since = page["next_since"]
+                    if not page["has_more"]:
+                        break
+                self.version = since
+                self._synced_at = time.monotonic()
+                return
+
+        self.rebuild(load, version)
+        self._synced_at = time.monotonic()
+
+    def upsert(self, item) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("upsert", item))
+            if self._built:
+                self._upsert(item)
+
+    def remove(self, index: int) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(("remove", index))
+            if self._built:
+                self._remove(index)
+
+    def _build(self, items: Iterable):
+        raise NotImplementedError
+
+    def _install(self, state) -> None:
+        raise NotImplementedError
+
+    def _upsert(self, item) -> None:
+        raise NotImplementedError
+
+    def _remove(self, index: int) -> None:
+        raise NotImplementedError
@@ -0,0 +1,188 @@
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from services.live_index import LiveIndex
+
+CellKey = Tuple[int, int]
+
+
+class MapPoint(NamedTuple):
+    index: int
+    x: float
+    y: float
+    citations: int
+    journal: str
+    title: str
+
+
+class _Cell:
+    __slots__ = ("count", "sum_x", "sum_y", "journals", "top", "members")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.journals = Counter()
+        self.top: Optional[MapPoint] = None
+        self.members: Optional[Dict[int, MapPoint]] = None
+
+
+def _rank(point: MapPoint) -> tuple:
+    return (point.citations or 0, -point.index)
+
+
+class MapTileService(LiveIndex):
+    """Grid pyramid over article coordinates, served as slippy-map style tiles.
+
+    Level `l` splits the bounding box of the corpus into 2^l x 2^l cells and
+    every article is counted in exactly one cell per level. A tile at zoom `z`
+    is the 2^CELL_BITS x 2^CELL_BITS block of cells at level z + CELL_BITS, so
+    a tile response never holds more than 256 cells whatever the corpus size.
+    Tile `y` grows with the y coordinate.
+    """
+    MAX_ZOOM = 8
+    CELL_BITS = 4
+    DEFAULT_BOUNDS = (-50.0, -50.0, 50.0, 50.0)
+
+    def __init__(self):
+        super().__init__()
+        self._finest = self.MAX_ZOOM + self.CELL_BITS
+        self._levels: List[Dict[CellKey, _Cell]] = []
+        self._points: Dict[int, MapPoint] = {}
+        self._bounds = self.DEFAULT_BOUNDS
+
+    def _build(self, items):
+        points = list(items)
+        levels = [dict() for _ in range(self._finest + 1)]
+        bounds = self._compute_bounds(points)
+        by_index = {}
+        for point in points:
+            by_index[point.index] = point
+            self._insert(levels, bounds, point)
+        return levels, bounds, by_index
+
+    def _install(self, state) -> None:
+        self._levels, self._bounds, self._points = state
+
+    def get_tile(self, z: int, x: int, y: int) -> dict:
+        if not 0 <= z <= self.MAX_ZOOM:
+            raise ValueError(f"Zoom must be between 0 and {self.MAX_ZOOM}")
+        if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"Tile coordinates out of range for zoom {z}")
+
+        side = 2 ** self.CELL_BITS
+        cells = []
+        with self._lock:
+            level = self._levels[z + self.CELL_BITS] if self._levels else {}
+            xmin, ymin, xmax, ymax = self._bounds
+            for cx in range(x * side, (x + 1) * side):
+                for cy in range(y * side, (y + 1) * side):
+                    cell = level.get((cx, cy))
+                    if cell is None:
+                        continue
+                    cells.append({
+                        "count": cell.count,
+                        "centroid": {"x": cell.sum_x / cell.count, "y": cell.sum_y / cell.count},
+                        "top_article": {
+                            "index": cell.top.index,
+                            "title": cell.top.title,
+                            "citations": cell.top.citations
+                        },
+                        "dominant_journal": cell.journals.most_common(1)[0][0] if cell.journals else None
+                    })
+
+        tile_width = (xmax - xmin) / 2 ** z
+        tile_height = (ymax - ymin) / 2 ** z
+        return {
+            "z": z,
+            "x": x,
+            "y": y,
+            "bounds": {
+                "xmin": xmin + x * tile_width,
+                "xmax": xmin + (x + 1) * tile_width,
+                "ymin": ymin + y * tile_height,
+                "ymax": ymin + (y + 1) * tile_height
+            },
+            "cells": cells
+        }
+
+    def _compute_bounds(self, points: List[MapPoint]) -> Tuple[float, float, float, float]:
+        if not points:
+            return self.DEFAULT_BOUNDS
+        xs = [point.x for point in points]
+        ys = [point.y for point in points]
+        xmin, xmax, ymin, ymax = min(xs), max(xs), min(ys), max(ys)
+        pad_x = max((xmax - xmin) * 0.01, 1e-6)
+        pad_y = max((ymax - ymin) * 0.01, 1e-6)
+        return (xmin - pad_x, ymin - pad_y, xmax + pad_x, ymax + pad_y)
+
+    def _finest_key(self, bounds, point: MapPoint) -> CellKey:
+        xmin, ymin, xmax, ymax = bounds
+        side = 2 ** self._finest
+        cx = int((point.x - xmin) / (xmax - xmin) * side)
+        cy = int((point.y - ymin) / (ymax - ymin) * side)
+        # Points written after the last rebuild may fall outside the bounds; clamp them to the edge.
+        return (min(max(cx, 0), side - 1), min(max(cy, 0), side - 1))
+
+    def _insert(self, levels, bounds, point: MapPoint) -> None:
+        cx, cy = self._finest_key(bounds, point)
+        for level in range(self._finest, -1, -1):
+            shift = self._finest - level
+            key = (cx >> shift, cy >> shift)
+            cell = levels[level].get(key)
+            if cell is None:
+                cell = levels[level][key] = _Cell()
+                if level == self._finest:
+                    cell.members = {}
+            cell.count += 1
+            cell.sum_x += point.x
+            cell.sum_y += point.y
+            cell.journals[point.journal] += 1
+            if cell.members is not None:
+                cell.members[point.index] = point
+            if cell.top is None or _rank(point) > _rank(cell.top):
+                cell.top = point
+
+    def _upsert(self, point: MapPoint) -> None:
+        self._remove(point.index)
+        self._points[point.index] = point
+        self._insert(self._levels, self._bounds, point)
+
+    def _remove(self, index: int) -> None:
+        point = self._points.pop(index, None)
+        if point is None:
+            return
+
+        cx, cy = self._finest_key(self._bounds, point)
+        for level in range(self._finest, -1, -1):
+            shift = self._finest - level
+            key = (cx >> shift, cy >> shift)
+            cells = self._levels[level]
+            cell = cells[key]
+            cell.count -= 1
+            if cell.count == 0:
+                del cells[key]
+                continue
+
+            cell.sum_x -= point.x
+            cell.sum_y -= point.y
+            cell.journals[point.journal] -= 1
+            if cell.journals[point.journal] <= 0:
+                del cell.journals[point.journal]
+            if cell.members is not None:
+                del cell.members[index]
+            if cell.top.index == index:
+                cell.top = self._recompute_top(level, key, cell)
+
+    def _recompute_top(self, level: int, key: CellKey, cell: _Cell) -> MapPoint:
+        if cell.members is not None:
+            return max(cell.members.values(), key=_rank)
+
+        children = self._levels[level + 1]
+        cx, cy = key
+        candidates = (
+            children[child].top
+            for child in ((2 * cx, 2 * cy), (2 * cx + 1, 2 * cy), (2 * cx, 2 * cy + 1), (2 * cx + 1, 2 * cy + 1))
+            if child in children
+        )
+        return max(candidates, key=_rank)
@@ -0,0 +1,141 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsService:
+    """In-process metric registry rendered in the Prometheus text format.
+
+    Recording is a dict lookup and an add under a lock; all formatting and
+    gauge evaluation is deferred until someone scrapes `render()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, Callable[[], float]]] = {}
+
+    def describe(self, name: str, metric_type: str, help_text: str) -> None:
+        self._descriptions[name] = (metric_type, help_text)
+
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        key = self._label_set(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = LATENCY_BUCKETS, **labels) -> None:
+        key = self._label_set(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def register_gauge(self, name: str, callback: Callable[[], float], **labels) -> None:
+        """Register a gauge whose value is computed only when metrics are scraped."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._label_set(labels)] = callback
+
+    def observe_request(self, method: str, route: str, status_code: int, duration: float,
+                        query_count: int = 0, query_duration: float = 0.0) -> None:
+        self.increment("http_requests_total", method=method, route=route, status=str(status_code))
+        self.observe("http_request_duration_seconds", duration, method=method, route=route)
+        self.observe("http_request_db_queries", query_count, buckets=QUERY_COUNT_BUCKETS, route=route)
+        self.observe("http_request_db_duration_seconds", query_duration, route=route)
+
+    def observe_query(self, duration: float) -> None:
+        self.increment("db_queries_total")
+        self.increment("db_query_duration_seconds_total", duration)
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(self._label_set(labels), 0.0)
+
+    def render(self) -> str:
+        lines = []
+
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+
+        for name in sorted(counters):
+            self._render_header(lines, name, "counter")
+            for labels, value in counters[name].items():
+                lines.append(f"{name}{self._format_labels(labels)} {self._format_value(value)}")
+
+        for name in sorted(gauges):
+            self._render_header(lines, name, "gauge")
+            for labels, callback in gauges[name].items():
+                try:
+                    value = float(callback())
+                except Exception:
+                    continue
+                lines.append(f"{name}{self._format_labels(labels)} {self._format_value(value)}")
+
+        for name in sorted(histograms):
+            self._render_header(lines, name, "histogram")
+            for labels, (buckets, counts, total, count) in histograms[name].items():
+                cumulative = 0
+                for upper_bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (("le", self._format_value(upper_bound)),)
+                    lines.append(f"{name}_bucket{self._format_labels(bucket_labels)} {cumulative}")
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{self._format_labels(inf_labels)} {count}")
+                lines.append(f"{name}_sum{self._format_labels(labels)} {self._format_value(total)}")
+                lines.append(f"{name}_count{self._format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+    def _render_header(self, lines: list, name: str, default_type: str) -> None:
+        metric_type, help_text = self._descriptions.get(name, (default_type, None))
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    @staticmethod
+    def _label_set(labels: dict) -> LabelSet:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def _format_labels(labels: LabelSet) -> str:
+        if not labels:
+            return ""
+        pairs = (f'{key}="{MetricsService._escape(value)}"' for key, value in labels)
+        return "{" + ",".join(pairs) + "}"
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @staticmethod
+    def _format_value(value: float) -> str:
+        if float(value).is_integer():
+            return str(int(value))
+        return repr(float(value))
@@ -0,0 +1,392 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.abstracts_encoder import AbstractsEncoder
+from services.knn_service import project_coordinates
+from services.validation_service import ValidationService
+
+# Bump when the cleaning rules change, so cleaned checkpoints are rebuilt.
+CLEANING_VERSION = 1
+MODEL_NAME = "all-MiniLM-L6-v2"
+OUTPUT_FIELDS = ("id", "title", "authors", "journal", "abstract", "year", "citations")
+
+
+def clean_text(text) -> str:
+    return " ".join(str(text).split()) if text else ""
+
+
+def parse_year(record: dict) -> Optional[int]:
+    """`year` if given, else the year of the first arXiv version or of `update_date`"""
+    candidates = [record.get("year")]
+    versions = record.get("versions") or []
+    if versions and isinstance(versions[0], dict):
+        candidates.append(versions[0].get("created"))
+    candidates.append(record.get("update_date"))
+    for candidate in candidates:
+        match = re.search(r"\b(\d{4})\b", str(candidate or ""))
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def clean_record(record: dict) -> dict:
+    """Raw arXiv metadata (or an already processed article) as the fields the importer reads"""
+    citations = pd.to_numeric(record.get("citations"), errors="coerce")
+    return {
+        "id": str(record.get("id") or ""),
+        "title": clean_text(record.get("title")),
+        "authors": clean_text(record.get("authors")) or "Unknown",
+        "journal": clean_text(record.get("journal") or record.get("journal-ref")) or "Unknown",
+        "abstract": clean_text(record.get("abstract")),
+        "year": parse_year(record),
+        "citations": 0 if pd.isna(citations) else int(citations),
+    }
+
+
+def embedding_key(abstract: str) -> bytes:
+    """Cache key of an abstract's embedding; changes with the text or the model"""
+    return hashlib.sha256(f"{MODEL_NAME}\n{abstract}".encode()).hexdigest().encode()
+
+
+def read_records(paths: Sequence[str]) -> Iterator[dict]:
+    """Records from JSON arrays, or from JSON-lines files (the arXiv metadata snapshot format)"""
+    for path in paths:
+        with open(path) as file:
+            first = file.read(1)
+            while first and first.isspace():
+                first = file.read(1)
+            file.seek(0)
+            if first == "[":
+                yield from json.load(file)
+            else:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+def _digest(*parts) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VectorCache:
+    """Content-addressed float32 vectors in append-only pairs of `.npy` shards.
+
+    A shard's keys file is written after its vectors file, so a run that
+    dies mid-write leaves no half-visible shard. Vectors are memory-mapped;
+    only the key index is held in memory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._shards: List[np.ndarray] = []
+        self._index: Dict[bytes, Tuple[int, int]] = {}
+        for keys_path in sorted(glob.glob(os.path.join(directory, "keys-*.npy"))):
+            vectors = np.load(keys_path.replace("keys-", "vectors-"), mmap_mode="r")
+            shard = len(self._shards)
+            self._shards.append(vectors)
+            for row, key in enumerate(np.load(keys_path).tolist()):
+                self._index[key] = (shard, row)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, keys: Sequence[bytes]) -> np.ndarray:
+        return np.array([self._shards[shard][row] for shard, row in (self._index[key] for key in keys)], dtype=np.float32)
+
+    def add(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        if not len(keys):
+            return
+        name = f"{int(time.time() * 1000):016d}-{len(self._shards):05d}"
+        vectors_path = os.path.join(self.directory, f"vectors-{name}.npy")
+        keys_path = os.path.join(self.directory, f"keys-{name}.npy")
+        np.save(vectors_path, np.asarray(vectors, dtype=np.float32))
+        np.save(keys_path + ".tmp.npy", np.array(keys, dtype="S64"))
+        os.replace(keys_path + ".tmp.npy", keys_path)
+
+        shard = len(self._shards)
+        self._shards.append(np.load(vectors_path, mmap_mode="r"))
+        for row, key in enumerate(keys):
+            self._index[key] = (shard, row)
+
+
+_worker_encoder = None
+
+
+def _start_worker(encoder_factory: Callable[[], AbstractsEncoder]) -> None:
+    global _worker_encoder
+    _worker_encoder = encoder_factory()
+
+
+def _encode_chunk(abstracts: List[str], batch_size: int) -> np.ndarray:
+    return np.asarray(_worker_encoder.encode_batch(abstracts, batch_size=batch_size), dtype=np.float32)
+
+
+class PreprocessingPipeline:
+    """Raw arXiv metadata -> cleaned records -> embeddings -> 2D layout -> sharded output.
+
+    Records move through the stages one shard of `shard_size` at a time, so
+    memory holds a shard rather than the corpus; only the t-SNE layout
+    needs every embedding at once. Every stage leaves a checkpoint under
+    `work_dir` together with a digest of its input, and is skipped when
+    that digest has not changed. Embeddings are cached by abstract hash and
+    coordinates by embedding key, so a re-run only encodes new or edited
+    abstracts. New records are placed on the existing layout by
+    nearest-neighbour interpolation against up to `reference_size` placed
+    ones; pass `relayout=True` to recompute the whole t-SNE layout instead.
+    """
+
+    def __init__(self, work_dir: str, output_dir: str, workers: int = 1, batch_size: int = 64,
+                 chunk_size: int = 1024, shard_size: int = 10000, reference_size: int = 20000,
+                 formats: Sequence[str] = ("ndjson",), relayout: bool = False,
+                 encoder_factory: Callable[[], AbstractsEncoder] = AbstractsEncoder, log=print):
+        self.work_dir = work_dir
+        self.output_dir = output_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.shard_size = shard_size
+        self.reference_size = reference_size
+        self.formats = tuple(formats)
+        self.relayout = relayout
+        self.encoder_factory = encoder_factory
+        self.log = log
+        self.clean_dir = os.path.join(work_dir, "clean")
+        os.makedirs(work_dir, exist_ok=True)
+
+    def run(self, inputs: Sequence[str]) -> int:
+        digest = self.clean(inputs)
+        digest = self.embed(digest)
+        digest = self.layout(digest)
+        self.write(digest)
+        return self._manifest("clean")["count"]
+
+    def clean(self, inputs: Sequence[str]) -> str:
+        """Cleaned, de-duplicated and validated records as NDJSON shards, each with its embedding keys"""
+        digest = _digest(
+            CLEANING_VERSION,
+            MODEL_NAME,
+            self.shard_size,
+            *(f"{os.path.basename(path)}:{_file_digest(path)}" for path in inputs)
+        )
+        if self._stage_done("clean", digest) and self._clean_shards():
+            self.log("clean: unchanged input, using checkpoint")
+            return digest
+
+        os.makedirs(self.clean_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(self.clean_dir, "clean-*")):
+            os.remove(stale)
+
+        validation_service = ValidationService()
+        count, dropped, shards = 0, 0, 0
+        seen_ids = set()
+
+        def flush(records: List[dict]) -> List[dict]:
+            errors = validation_service.validate_batch(pd.DataFrame(records, columns=list(OUTPUT_FIELDS)))
+            records = [record for position, record in enumerate(records) if position not in errors]
+            name = os.path.join(self.clean_dir, f"clean-{shards:05d}")
+            np.save(name + ".keys.npy", np.array([embedding_key(record["abstract"]) for record in records], dtype="S64"))
+            self._write_ndjson(name + ".ndjson", records)
+            return records
+
+        shard = []
+        for record in map(clean_record, read_records(inputs)):
+            if record["id"] and record["id"] in seen_ids:
+                continue
+            seen_ids.add(record["id"])
+            shard.append(record)
+            if len(shard) == self.shard_size:
+                kept = len(flush(shard))
+                count, dropped, shards, shard = count + kept, dropped + len(shard) - kept, shards + 1, []
+        if shard:
+            kept = len(flush(shard))
+            count, dropped = count + kept, dropped + len(shard) - kept
+
+        if dropped:
+            self.log(f"clean: dropped {dropped} invalid records")
+        self._finish_stage("clean", digest, count=count)
+        self.log(f"clean: {count} records")
+        return digest
+
+    def embed(self, clean_digest: str) -> str:
+        """Encode every abstract that is not in the embedding cache yet"""
+        digest = _digest(clean_digest)
+        if self._stage_done("embed", digest):
+            self.log("embed: unchanged records, using cached embeddings")
+            return digest
+
+        cache = VectorCache(os.path.join(self.work_dir, "embeddings"))
+        records, encoded = 0, 0
+        with self._encoder() as encode:
+            for name in self._clean_shards():
+                missing = {}
+                for record, key in zip(read_records([name + ".ndjson"]), np.load(name + ".keys.npy").tolist()):
+                    records += 1
+                    if key not in cache and key not in missing:
+                        missing[key] = record["abstract"]
+                if not missing:
+                    continue
+
+                abstracts = list(missing.values())
+                chunks = [abstracts[start:start + self.chunk_size] for start in range(0, len(abstracts), self.chunk_size)]
+                # Stored per shard, so an interrupted run keeps what it already encoded.
+                cache.add(list(missing), np.concatenate(list(encode(chunks))))
+                encoded += len(missing)
+                self.log(f"embed: {encoded} encoded")
+
+        self._finish_stage("embed", digest, encoded=encoded)
+        self.log(f"embed: {records - encoded} cached, {encoded} encoded")
+        return digest
+
+    @contextmanager
+    def _encoder(self) -> Iterator[Callable[[List[List[str]]], Iterator[np.ndarray]]]:
+        if self.workers <= 1:
+            _start_worker(self.encoder_factory)
+            yield lambda chunks: (_encode_chunk(chunk, self.batch_size) for chunk in chunks)
+            return
+
+        # Each process loads its own model once; chunks come back in submission order.
+        with ProcessPoolExecutor(self.workers, initializer=_start_worker, initargs=(self.encoder_factory,)) as executor:
+            yield lambda chunks: executor.map(_encode_chunk, chunks, [self.batch_size] * len(chunks))
+
+    def layout(self, embed_digest: str) -> str:
+        """Coordinates for every distinct embedding key, kept sorted by key so shards can look theirs up"""
+        directory = os.path.join(self.work_dir, "layout")
+        os.makedirs(directory, exist_ok=True)
+        keys_path, coordinates_path = os.path.join(directory, "keys.npy"), os.path.join(directory, "coordinates.npy")
+        has_checkpoint = os.path.exists(keys_path) and os.path.exists(coordinates_path)
+        if has_checkpoint and self._stage_done("layout", embed_digest) and not self.relayout:
+            self.log("layout: unchanged embeddings, using checkpoint")
+            return self._manifest("layout")["output"]
+
+        keys = np.unique(np.concatenate(
+            [np.load(name + ".keys.npy") for name in self._clean_shards()] or [np.empty(0, dtype="S64")]
+        ))
+        cache = VectorCache(os.path.join(self.work_dir, "embeddings"))
+        previous_keys, previous_coordinates = np.empty(0, dtype="S64"), np.empty((0, 2))
+        if has_checkpoint:
+            previous_keys, previous_coordinates = np.load(keys_path), np.load(coordinates_path)
+        positions = self._lookup(previous_keys, keys)
+        known = positions >= 0
+
+        if self.relayout or not known.any():
+            self.log(f"layout: t-SNE over {len(keys)} embeddings")
+            embeddings = cache.get_many(keys.tolist()) if len(keys) else np.empty((0, 0), dtype=np.float32)
+            coordinates = np.asarray(self.encoder_factory().get_layout(embeddings), dtype=np.float64).reshape(len(keys), 2)
+        else:
+            coordinates = np.zeros((len(keys), 2))
+            coordinates[known] = previous_coordinates[positions[known]]
+            new = np.flatnonzero(~known)
+            if len(new):
+                self.log(f"layout: placing {len(new)} new embeddings next to their neighbours")
+                placed = np.flatnonzero(known)
+                reference = placed[np.linspace(0, len(placed) - 1, min(len(placed), self.reference_size)).astype(int)]
+                reference_embeddings = cache.get_many(keys[reference].tolist())
+                for start in range(0, len(new), self.chunk_size):
+                    chunk = new[start:start + self.chunk_size]
+                    coordinates[chunk] = project_coordinates(
+                        cache.get_many(keys[chunk].tolist()), reference_embeddings, coordinates[reference]
+                    )
+
+        np.save(keys_path, keys)
+        np.save(coordinates_path, coordinates)
+        output = _digest(embed_digest, _file_digest(coordinates_path))
+        self._finish_stage("layout", embed_digest, count=len(keys), output=output)
+        return output
+
+    @staticmethod
+    def _lookup(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """Position of each key in `sorted_keys`, or -1 when it is not there"""
+        if not len(sorted_keys):
+            return np.full(len(keys), -1)
+        positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        return np.where(sorted_keys[positions] == keys, positions, -1)
+
+    def write(self, layout_digest: str) -> None:
+        # The layout digest covers the records, the model and the coordinates, so no output bytes are hashed.
+        digest = _digest(layout_digest, self.shard_size, *self.formats)
+        if self._stage_done("write", digest) and glob.glob(os.path.join(self.output_dir, "articles-*")):
+            self.log("write: output is up to date")
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(self.output_dir, "articles-*")):
+            os.remove(stale)
+
+        cache = VectorCache(os.path.join(self.work_dir, "embeddings"))
+        layout_keys = np.load(os.path.join(self.work_dir, "layout", "keys.npy"))
+        layout_coordinates = np.load(os.path.join(self.work_dir, "layout", "coordinates.npy"), mmap_mode="r")
+        count, shard_count = 0, 0
+        for shard, name in enumerate(self._clean_shards()):
+            keys = np.load(name + ".keys.npy")
+            if not len(keys):
+                continue
+            embeddings = cache.get_many(keys.tolist())
+            coordinates = layout_coordinates[self._lookup(layout_keys, keys)]
+            articles = [
+                {**record, "coordinates": {"x": float(x), "y": float(y)}, "embedding": embedding}
+                for record, (x, y), embedding in zip(read_records([name + ".ndjson"]), coordinates.tolist(),
+                                                     embeddings.tolist())
+            ]
+            if "ndjson" in self.formats:
+                self._write_ndjson(os.path.join(self.output_dir, f"articles-{shard:05d}.ndjson"), articles)
+            if "parquet" in self.formats:
+                pd.DataFrame(articles).to_parquet(os.path.join(self.output_dir, f"articles-{shard:05d}.parquet"), index=False)
+            count += len(articles)
+            shard_count += 1
+
+        self._finish_stage("write", digest, count=count, shards=shard_count)
+        self.log(f"write: {count} articles in {shard_count} shards to {self.output_dir}")
+
+    def _clean_shards(self) -> List[str]:
+        return [path[:-len(".ndjson")] for path in sorted(glob.glob(os.path.join(self.clean_dir, "clean-*.ndjson")))]
+
+    @staticmethod
+    def _write_ndjson(path: str, records: List[dict]) -> None:
+        with open(path + ".tmp", "w") as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+        os.replace(path + ".tmp", path)
+
+    def _manifest_path(self, stage: str) -> str:
+        return os.path.join(self.work_dir, f"{stage}.manifest.json")
+
+    def _manifest(self, stage: str) -> dict:
+        try:
+            with open(self._manifest_path(stage)) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _stage_done(self, stage: str, digest: str) -> bool:
+        return self._manifest(stage).get("digest") == digest
+
+    def _finish_stage(self, stage: str, digest: str, **details) -> None:
+        with open(self._manifest_path(stage) + ".tmp", "w") as file:
+            json.dump({"digest": digest, "finished_at": time.time(), **details}, file)
+        os.replace(self._manifest_path(stage) + ".tmp", self._manifest_path(stage))
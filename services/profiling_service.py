@@ -0,0 +1,144 @@
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+IDLE_FRAME_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+class SamplingProfiler:
+    """Statistical profiler that periodically samples the stacks of all busy threads.
+
+    Samples are aggregated as folded stacks (`frame;frame;frame count`), which
+    flamegraph.pl, speedscope and inferno read directly. Threads parked in a
+    lock, queue or selector are skipped, so an idle event loop or thread pool
+    does not drown out the request being profiled.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._fold(frame)
+                if stack:
+                    self.samples[stack] += 1
+
+    @staticmethod
+    def _fold(frame) -> Optional[str]:
+        if frame.f_code.co_filename.endswith(IDLE_FRAME_FILES):
+            return None
+
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}")
+            frame = frame.f_back
+        return ";".join(reversed(frames))
+
+    @staticmethod
+    def to_folded(samples: Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class ProfilingService:
+    """Decides which requests get profiled and stores their folded stacks on disk.
+
+    A request is profiled when it carries the `X-Profile` header (if
+    PROFILE_HEADER_ENABLED is set) or when it is picked by PROFILE_SAMPLE_RATE.
+    Only one request is profiled at a time, because the sampler sees every
+    thread in the process and overlapping profiles would double count.
+    The oldest profiles are deleted once there are more than `max_files`
+    or they take more than `max_bytes`.
+    """
+    HEADER = b"x-profile"
+
+    def __init__(self, output_dir: Path, sample_rate: float = 0.0, header_enabled: bool = False,
+                 interval: float = 0.005, max_files: int = 200, max_bytes: int = 100 * 1024 * 1024):
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.header_enabled = header_enabled
+        self.interval = interval
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls, output_dir: Path) -> "ProfilingService":
+        return cls(
+            output_dir,
+            sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", "0")),
+            header_enabled=os.environ.get("PROFILE_HEADER_ENABLED", "0") == "1",
+            interval=float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000,
+            max_files=int(os.environ.get("PROFILE_MAX_FILES", "200")),
+            max_bytes=int(float(os.environ.get("PROFILE_MAX_MB", "100")) * 1024 * 1024)
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.header_enabled or self.sample_rate > 0
+
+    def should_profile(self, headers: list) -> bool:
+        if self.header_enabled and any(name == self.HEADER and value == b"1" for name, value in headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[SamplingProfiler]:
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = SamplingProfiler(self.interval)
+        profiler.start()
+        return profiler
+
+    def finish(self, profiler: SamplingProfiler, method: str, route: str) -> str:
+        try:
+            samples = profiler.stop()
+        finally:
+            self._active.release()
+
+        self.output_dir.mkdir(exist_ok=True)
+        route_slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        profile_id = f"{int(time.time() * 1000)}-{method.lower()}-{route_slug}"
+        (self.output_dir / f"{profile_id}.folded").write_text(SamplingProfiler.to_folded(samples))
+        self._prune()
+        return profile_id
+
+    def _prune(self) -> None:
+        # Profile ids start with the millisecond timestamp, so name order is age order; the newest is always kept.
+        paths = sorted(self.output_dir.glob("*.folded"), reverse=True)
+        total = 0
+        for kept, path in enumerate(paths):
+            try:
+                total += path.stat().st_size
+                if kept > 0 and (kept >= self.max_files or total > self.max_bytes):
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def get_profile_path(self, profile_id: str) -> Optional[Path]:
+        if not re.fullmatch(r"[A-Za-z0-9_\-]+", profile_id):
+            return None
+        path = self.output_dir / f"{profile_id}.folded"
+        return path if path.exists() else None
@@ -0,0 +1,87 @@
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Tuple
+
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class SearchCache:
+    """LRU cache of ranked article indexes for search queries.
+
+    Entries remember the data version they were computed at; a lookup with a
+    different version is a miss and drops the entry. Entries older than
+    `ttl` seconds are dropped too, which bounds staleness when the version
+    itself lags (a replica behind the one the scan read from). Ids are
+    stored as int64 arrays so the byte budget is exact rather than estimated.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, max_entry_ids: int = 50000,
+                 ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_ids = max_entry_ids
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, array]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, mode: str, **filters) -> tuple:
+        return (query.lower(), mode, tuple(sorted(filters.items())))
+
+    def get(self, key: Hashable, version: int) -> Optional[List[int]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or time.monotonic() - entry[1] >= self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2].tolist()
+
+    def put(self, key: Hashable, version: int, ids: List[int]) -> None:
+        if len(ids) > self.max_entry_ids:
+            return
+
+        ids_array = array("q", ids)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, time.monotonic(), ids_array)
+            self.bytes += self._entry_size(ids_array)
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _drop(self, key: Hashable) -> None:
+        _, _, ids_array = self._entries.pop(key)
+        self.bytes -= self._entry_size(ids_array)
+
+    @staticmethod
+    def _entry_size(ids_array: array) -> int:
+        return ENTRY_OVERHEAD_BYTES + ids_array.itemsize * len(ids_array)
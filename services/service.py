@@ -1,7 +1,29 @@
+import os
+import threading
+import time
+import numpy as np
+from datalink.routing import primary_reads
 from repository.repository import Repository
 from data.domain.article import Article, Coordinates
 from services.abstracts_encoder import AbstractsEncoder
 from services.validation_service import ValidationService
+from services.map_tile_service import MapTileService, MapPoint
+from services.search_cache import SearchCache
+from services.suggest_service import SuggestService, SuggestSource
+from services.knn_service import EmbeddingIndex, KnnGraphBuilder, stream_embedding_matrix
+from services.embedding_snapshot import EmbeddingSnapshot, write_snapshot
+from services.export_service import ExportService
+
+SNAPSHOT_CHECK_SECONDS = 5.0
+
+
+def map_point(article: Article) -> MapPoint:
+    return MapPoint(article.index, article.coordinates.x, article.coordinates.y, article.citations, article.journal,
+                    article.title)
+
+
+def suggest_source(article: Article) -> SuggestSource:
+    return SuggestSource(article.index, article.title, article.authors, article.journal, article.citations)
 
 class Service:
     _repository: Repository
@@ -9,7 +31,17 @@ class Service:
     def __init__(self, repository: Repository):
         self.repository = repository
         self.validation_service = ValidationService()
-        # self.abstracts_encoder = AbstractsEncoder()
+        self.map_tiles = MapTileService()
+        self.search_cache = SearchCache(ttl=float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "60")))
+        self.suggestions = SuggestService()
+        self.knn_builder = KnnGraphBuilder(k=20)
+        # Loaded on the first incremental update, then kept current from the change log.
+        self.embedding_index = None
+        self._embedding_index_lock = threading.Lock()
+        self.abstracts_encoder = AbstractsEncoder()
+        self.embedding_snapshot = None
+        self.embedding_snapshot_path = None
+        self._snapshot_checked_at = 0.0
 
     def get_articles_by_year(self, year: int):
         all_articles = self.repository.get_articles()
@@ -18,6 +50,9 @@ class Service:
 
     def get_all_articles(self):
         return self.repository.get_articles()
+
+    def get_all_articles_with_version(self):
+        return self.repository.get_articles_with_version()
     
     def get_sorted_articles(self, sort_by: str = 'citations', order: str = 'desc'):
         articles = self.repository.get_articles()
@@ -31,6 +66,13 @@ class Service:
         else:
             return articles
     
+    def get_articles_in_bbox(self, xmin: float, xmax: float, ymin: float, ymax: float, limit: int):
+        """Articles positioned inside the viewport, most cited first"""
+        if xmin > xmax or ymin > ymax:
+            raise ValueError("Bounding box minimum must not exceed its maximum")
+
+        return self.repository.get_articles_in_bbox(xmin, xmax, ymin, ymax, limit)
+    
     def get_next_index(self) -> int:
         """Get the next available index for a new article"""
         all_articles = self.repository.get_articles()
@@ -53,15 +95,22 @@ class Service:
         if not self.validation_service.validate_article(article):
             raise ValueError("Invalid article")
 
-        article.embeddings = [0.1, 0.2, 0.3]
+        self._prepare_new_article(article)
+
+        # Return the saved article with its database ID
+        saved_article = self.repository.add_article(article)
+        self._after_article_saved(saved_article)
+        return saved_article
+
+    def _prepare_new_article(self, article: Article):
+        # Embeddings and coordinates are computed by the enrichment worker after the row is stored.
+        article.embeddings = []
+        article.enrichment_status = "pending"
         
         # Only set coordinates if not already set
         if not article.coordinates or (article.coordinates.x == 0 and article.coordinates.y == 0):
             article.coordinates = Coordinates(x=0.1, y=0.2)
 
-        # Return the saved article with its database ID
-        return self.repository.add_article(article)
-
     def update_article(self, article: Article):
         # article.embeddings = self.abstracts_encoder.encode(article.abstract)
         # article.coordinates = self.abstracts_encoder.get_coordinates(article.embeddings)
@@ -69,22 +118,303 @@ class Service:
         if not self.validation_service.validate_article(article):
             raise ValueError("Invalid article")
 
-        article.embeddings = [0.1, 0.2, 0.3]
-        article.coordinates = Coordinates(x=0.1, y=0.2)
+        self._prepare_updated_article(article)
+
+        updated_article = self.repository.update_article(article)
+        self._after_article_saved(updated_article)
+
+    def _prepare_updated_article(self, article: Article):
+        # The data link re-enriches only when the stored abstract changed; until then the
+        # previous embeddings and coordinates are kept.
+        article.enrichment_status = None
+
+    def apply_batch(self, creates: list[Article], updates: list[Article], delete_ids: list[int], user_id: int) -> dict:
+        """Validate a batch of writes together and apply the valid ones in a single transaction.
 
-        self.repository.update_article(article)
+        Returns one result per input item, in input order, under the keys
+        `creates`, `updates` and `deletes`.
+        """
+        create_results = [None] * len(creates)
+        valid_creates = []
+        create_errors = self.validation_service.validate_articles(creates)
+        for position, article in enumerate(creates):
+            if position in create_errors:
+                create_results[position] = {"status": "invalid", "error": "; ".join(create_errors[position])}
+            else:
+                self._prepare_new_article(article)
+                valid_creates.append((position, article))
+
+        update_results = [None] * len(updates)
+        valid_updates = []
+        update_errors = self.validation_service.validate_articles(updates)
+        for position, article in enumerate(updates):
+            if position in update_errors:
+                update_results[position] = {
+                    "status": "invalid", "id": str(article.index), "error": "; ".join(update_errors[position])
+                }
+            else:
+                self._prepare_updated_article(article)
+                valid_updates.append((position, article))
+
+        applied = self.repository.apply_batch(
+            [article for _, article in valid_creates],
+            [article for _, article in valid_updates],
+            delete_ids,
+            user_id
+        )
+
+        for (position, _), result in zip(valid_creates, applied["creates"]):
+            create_results[position] = result
+            if result["status"] == "created":
+                self._after_article_saved(result["article"])
+        for (position, _), result in zip(valid_updates, applied["updates"]):
+            update_results[position] = result
+            if result["status"] == "updated":
+                self._after_article_saved(result["article"])
+        for result in applied["deletes"]:
+            if result["status"] == "deleted":
+                self._after_article_deleted(int(result["id"]))
+
+        return {"creates": create_results, "updates": update_results, "deletes": applied["deletes"]}
 
     def delete_article(self, article_id: str):
         self.repository.delete_article(article_id)
+        if str(article_id).isdigit():
+            self._after_article_deleted(int(article_id))
     
     def delete_article_by_index(self, index: int):
         self.repository.delete_article_by_index(index)
+        self._after_article_deleted(index)
+
+    # Derived in-memory indexes see writes made through this service at once, and
+    # everyone else's (other workers, imports) when they next sync with the change log.
+
+    def _after_article_saved(self, article: Article):
+        self.map_tiles.upsert(map_point(article))
+        self.suggestions.upsert(suggest_source(article))
+
+    def _after_article_deleted(self, index: int):
+        self.map_tiles.remove(index)
+        self.suggestions.remove(index)
+
+    def _map_points(self):
+        return (MapPoint(*row) for row in self.repository.get_map_points())
+
+    def _suggest_sources(self):
+        return (SuggestSource(*row) for row in self.repository.get_suggest_sources())
+
+    def rebuild_map_tiles(self):
+        with primary_reads():
+            self.map_tiles.rebuild(self._map_points, self.repository.get_change_version)
+
+    def rebuild_suggestions(self):
+        with primary_reads():
+            self.suggestions.rebuild(self._suggest_sources, self.repository.get_change_version)
+
+    def sync_map_tiles(self):
+        with primary_reads():
+            self.map_tiles.sync(self.repository.get_change_version, self.repository.get_changes, self._map_points, map_point)
+
+    def sync_suggestions(self):
+        with primary_reads():
+            self.suggestions.sync(
+                self.repository.get_change_version, self.repository.get_changes, self._suggest_sources, suggest_source
+            )
+
+    def suggest(self, prefix: str, field: str = "title", k: int = 10) -> list:
+        self.sync_suggestions()
+        return self.suggestions.suggest(prefix, field, k)
+
+    def get_related_articles(self, index: int, k: int = 10):
+        return [
+            {"score": score, "article": article}
+            for score, article in self.repository.get_related_articles(index, k)
+        ]
+
+    def export_embedding_snapshot(self, path: str, dtype: str = "int8") -> int:
+        return write_snapshot(path, self.repository.iter_embeddings(), dtype)
+
+    def load_embedding_snapshot(self, path: str):
+        # Opened completely before the single reference swap, so readers see the old or the new snapshot, never a mix.
+        self.embedding_snapshot = EmbeddingSnapshot(path)
+        self.embedding_snapshot_path = path
+        self._snapshot_checked_at = time.monotonic()
+
+    def use_embedding_snapshot(self, path: str):
+        """Serve similar articles from the snapshot at `path`: loaded now if it exists, else once it is first exported"""
+        self.embedding_snapshot_path = path
+        if os.path.exists(path):
+            self.load_embedding_snapshot(path)
+
+    def _current_embedding_snapshot(self):
+        """The loaded snapshot, (re)opened when an export has appeared at or replaced it (checked every few seconds)"""
+        snapshot = self.embedding_snapshot
+        path = self.embedding_snapshot_path
+        if path is None or time.monotonic() - self._snapshot_checked_at < SNAPSHOT_CHECK_SECONDS:
+            return snapshot
+        self._snapshot_checked_at = time.monotonic()
+        if (snapshot is None and not os.path.exists(path)) or (snapshot is not None and snapshot.is_current()):
+            return snapshot
+        try:
+            self.load_embedding_snapshot(path)
+        except OSError as e:
+            print(f"Could not load embedding snapshot: {e}")
+        return self.embedding_snapshot
+
+    def get_similar_articles(self, index: int, k: int = 10, rerank: bool = False):
+        """Nearest articles by embedding, scored against the memory-mapped snapshot.
+
+        Articles written after the snapshot are still usable as the query
+        (their embedding is read from the database) but are not candidates.
+        """
+        snapshot = self._current_embedding_snapshot()
+        if snapshot is None:
+            raise RuntimeError("No embedding snapshot loaded")
+
+        vector = snapshot.vector(index)
+        if vector is None:
+            rows = self.repository.get_embeddings([index])
+            if not rows:
+                return None
+            vector = rows[0][1]
+
+        matches = snapshot.search(
+            vector,
+            k,
+            exclude_id=index,
+            rerank=self.repository.get_embeddings if rerank else None
+        )
+        articles = self.repository.get_articles_by_ids([article_id for article_id, _ in matches])
+        scores = dict(matches)
+        return [{"score": scores[article.index], "article": article} for article in articles]
+
+    def on_articles_enriched(self, articles: list[Article]):
+        for article in articles:
+            self._after_article_saved(article)
+        self.update_related_articles([article.index for article in articles])
+
+    def get_enrichment_job(self, job_id: int):
+        return self.repository.get_enrichment_job(job_id=job_id)
+
+    def get_article_enrichment(self, index: int):
+        return self.repository.get_enrichment_job(article_id=index)
+
+    def retry_enrichment_job(self, job_id: int) -> bool:
+        return self.repository.retry_enrichment_job(job_id)
+
+    def rebuild_related_articles(self):
+        """Recompute the whole k-nearest-neighbour graph from the stored embeddings"""
+        with primary_reads():
+            ids, matrix = stream_embedding_matrix(self.repository.iter_embeddings())
+        neighbour_ids, scores = self.knn_builder.build(ids, matrix)
+        self.repository.replace_neighbors(
+            {
+                article_id: list(zip(article_neighbours, article_scores))
+                for article_id, article_neighbours, article_scores in zip(ids.tolist(), neighbour_ids.tolist(), scores.tolist())
+            },
+            replace_all=True
+        )
+        with self._embedding_index_lock:
+            self.embedding_index = None
+
+    def _sync_embedding_index(self) -> EmbeddingIndex:
+        """The in-memory embedding index, brought up to date with every write recorded in the change log"""
+        if self.embedding_index is None:
+            # Read before the embeddings, so replaying the log from it can only repeat changes, never miss one.
+            version = self.repository.get_change_version()
+            ids, matrix = stream_embedding_matrix(self.repository.iter_embeddings())
+            self.embedding_index = EmbeddingIndex(ids, matrix, self.repository.get_neighbor_floors(), version)
+
+        index = self.embedding_index
+        while True:
+            page = self.repository.get_changes(index.version, 500)
+            for change in page["changes"]:
+                if change["operation"] == "delete":
+                    index.remove(change["article_id"])
+                else:
+                    index.upsert(change["article_id"], change["article"].embeddings)
+            index.version = page["next_since"]
+            if not page["has_more"]:
+                return index
+
+    def update_related_articles(self, indexes: list[int]):
+        """Give new or re-embedded articles their neighbours and add them to the lists they now belong in.
+
+        Only the changed vectors are read from the database; they are scored
+        against the in-memory embedding index. Reads go to the primary, since
+        the merge must see every committed write.
+        """
+        with self._embedding_index_lock, primary_reads():
+            index = self._sync_embedding_index()
+            changed = [article_id for article_id in indexes if article_id in index.positions]
+            if not changed:
+                return
+
+            ids, matrix = index.ids, index.matrix
+            # Until the graph has been built once there are no lists to join.
+            graph_built = bool(index.counts.any())
+            lists = {}
+            candidates = {}
+            for article_id in changed:
+                top_ids, top_scores, similarities = self.knn_builder.neighbours_of(
+                    matrix[index.positions[article_id]], ids, matrix, article_id
+                )
+                lists[article_id] = list(zip(top_ids.tolist(), top_scores.tolist()))
+                if not graph_built:
+                    continue
+                affected = np.nonzero(
+                    np.isfinite(similarities)
+                    & ((similarities > index.floors) | (index.counts < self.knn_builder.k))
+                )[0]
+                for position in affected.tolist():
+                    candidates.setdefault(int(ids[position]), []).append((article_id, float(similarities[position])))
+
+            for article_id in lists:
+                candidates.pop(article_id, None)
+            updates = self.repository.merge_neighbors(lists, candidates, self.knn_builder.merge)
+            for article_id, neighbours in updates.items():
+                index.set_neighbours(article_id, neighbours)
+
+    def export_articles(self, format: str, columns: list[str], year_from: int = None, year_to: int = None,
+                        chunk_size: int = 5000):
+        """Byte chunks of the export file; rows are read and encoded one chunk at a time"""
+        dimension = self.repository.get_embedding_dimension() if "embeddings" in columns else 0
+        exporter = ExportService(format, columns, dimension)
+        return exporter.stream(self.repository.iter_export_rows(columns, year_from, year_to, chunk_size))
+
+    def get_changes(self, since: int, limit: int = 500) -> dict:
+        return self.repository.get_changes(since, limit)
+
+    def get_change_version(self) -> int:
+        return self.repository.get_change_version()
+
+    def get_map_tile(self, z: int, x: int, y: int) -> dict:
+        self.sync_map_tiles()
+        return self.map_tiles.get_tile(z, x, y)
         
-    def search_articles(self, query: str):
+    def search_articles(self, query: str, year: int = None):
         if not query:
             return self.get_all_articles()
-            
-        all_articles = self.get_all_articles()
+
+        cache_key = SearchCache.make_key(query, "substring", year=year)
+        # The change log version is shared by every worker and bumped by every writer, including imports.
+        version = self.repository.get_change_version()
+        cached_ids = self.search_cache.get(cache_key, version)
+        if cached_ids is not None:
+            return self.repository.get_articles_by_ids(cached_ids)
+        return self._scan_articles(query, year, cache_key, version)
+
+    def search_article_ids(self, query: str, year: int = None) -> list[int]:
+        cache_key = SearchCache.make_key(query, "substring", year=year)
+        version = self.repository.get_change_version()
+        cached_ids = self.search_cache.get(cache_key, version)
+        if cached_ids is not None:
+            return cached_ids
+        return [article.index for article in self._scan_articles(query, year, cache_key, version)]
+
+    def _scan_articles(self, query: str, year: int, cache_key: tuple, version: int) -> list[Article]:
+        # `version` is read before the scan, so a write racing with it cannot be cached as current.
+        all_articles = self.get_all_articles() if year is None else self.repository.get_articles_by_year(year)
         results = []
         
         query_lower = query.lower()
@@ -92,5 +422,13 @@ class Service:
             searchable_text = f"{article.title} {article.authors} {article.abstract} {article.journal}".lower()
             if query_lower in searchable_text:
                 results.append(article)
-                
-        return results
\ No newline at end of file
+
+        result_ids = [article.index for article in results]
+        if None not in result_ids:
+            self.search_cache.put(cache_key, version, result_ids)
+        return results
+
+    def get_facets(self, query: str = None, year: int = None, top_journals: int = 10) -> dict:
+        """Year, journal and citation counts, optionally restricted to the results of a search"""
+        article_ids = self.search_article_ids(query, year) if query else None
+        return self.repository.get_facets(article_ids, year, top_journals)
@@ -0,0 +1,174 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from services.live_index import LiveIndex
+
+FIELDS = ("title", "author", "journal")
+
+
+class SuggestSource(NamedTuple):
+    index: int
+    title: str
+    authors: str
+    journal: str
+    citations: int
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def split_authors(authors: str) -> List[str]:
+    return [name.strip() for name in re.split(r",| and ", authors or "") if name.strip()]
+
+
+class _FieldIndex:
+    """Sorted (key, text) array for one field, plus per-text scores and members.
+
+    A text (a title, an author name or a journal) is ranked by the most cited
+    article it appears in. Top-k lists for short prefixes, whose ranges are
+    the widest, are cached and dropped only when a write can change them.
+    """
+    MAX_CACHED_PREFIX = 3
+
+    def __init__(self):
+        self.entries: List[Tuple[str, str]] = []
+        self.members: Dict[str, Dict[int, int]] = {}
+        self.scores: Dict[str, Tuple[int, int]] = {}
+        self.prefix_cache: Dict[str, list] = {}
+
+    def add(self, text: str, index: int, citations: int) -> None:
+        citations = citations or 0
+        members = self.members.get(text)
+        if members is None:
+            members = self.members[text] = {}
+            insort(self.entries, (normalize(text), text))
+        members[index] = citations
+
+        best = self.scores.get(text)
+        if best is None or (citations, -index) > (best[0], -best[1]):
+            self.scores[text] = (citations, index)
+        self._invalidate(text)
+
+    def remove(self, text: str, index: int) -> None:
+        members = self.members.get(text)
+        if members is None or index not in members:
+            return
+
+        del members[index]
+        if not members:
+            del self.members[text]
+            del self.scores[text]
+            position = bisect_left(self.entries, (normalize(text), text))
+            del self.entries[position]
+        elif self.scores[text][1] == index:
+            top_index, top_citations = max(members.items(), key=lambda item: (item[1], -item[0]))
+            self.scores[text] = (top_citations, top_index)
+        self._invalidate(text)
+
+    def top(self, prefix: str, k: int) -> list:
+        cacheable = len(prefix) <= self.MAX_CACHED_PREFIX and k <= SuggestService.MAX_K
+        if cacheable and prefix in self.prefix_cache:
+            return self.prefix_cache[prefix][:k]
+
+        limit = SuggestService.MAX_K if cacheable else k
+        low = bisect_left(self.entries, (prefix,))
+        high = bisect_left(self.entries, (prefix + "\uffff",))
+        best = heapq.nlargest(
+            limit,
+            (text for _, text in self.entries[low:high]),
+            key=lambda text: (self.scores[text][0], -self.scores[text][1])
+        )
+        results = [
+            {
+                "text": text,
+                "citations": self.scores[text][0],
+                "index": self.scores[text][1],
+                "count": len(self.members[text])
+            }
+            for text in best
+        ]
+
+        if cacheable:
+            self.prefix_cache[prefix] = results
+        return results[:k]
+
+    def _invalidate(self, text: str) -> None:
+        """Drop cached top-k lists that `text` is in, or that its new score would enter."""
+        if not self.prefix_cache:
+            return
+        key = normalize(text)
+        score = self.scores.get(text)
+        for length in range(1, self.MAX_CACHED_PREFIX + 1):
+            cached = self.prefix_cache.get(key[:length])
+            if cached is None:
+                continue
+            if any(result["text"] == text for result in cached):
+                del self.prefix_cache[key[:length]]
+            elif score is not None and (
+                len(cached) < SuggestService.MAX_K
+                or (score[0], -score[1]) > (cached[-1]["citations"], -cached[-1]["index"])
+            ):
+                del self.prefix_cache[key[:length]]
+
+
+class SuggestService(LiveIndex):
+    """Type-ahead over titles, author names and journals, served from memory."""
+    MAX_K = 20
+
+    def __init__(self):
+        super().__init__()
+        self._fields = {field: _FieldIndex() for field in FIELDS}
+        self._sources: Dict[int, SuggestSource] = {}
+
+    def _build(self, items):
+        fields = {field: _FieldIndex() for field in FIELDS}
+        sources = {}
+        for source in items:
+            sources[source.index] = source
+            for field, text in self._texts(source):
+                fields[field].members.setdefault(text, {})[source.index] = source.citations or 0
+
+        for index in fields.values():
+            index.entries = sorted((normalize(text), text) for text in index.members)
+            for text, members in index.members.items():
+                top_index, top_citations = max(members.items(), key=lambda item: (item[1], -item[0]))
+                index.scores[text] = (top_citations, top_index)
+        return fields, sources
+
+    def _install(self, state) -> None:
+        self._fields, self._sources = state
+
+    def suggest(self, prefix: str, field: str = "title", k: int = 10) -> list:
+        if field not in self._fields:
+            raise ValueError(f"Unknown suggestion field: {field}")
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            return self._fields[field].top(prefix, min(k, self.MAX_K))
+
+    def _upsert(self, source: SuggestSource) -> None:
+        self._remove(source.index)
+        self._sources[source.index] = source
+        for field, text in self._texts(source):
+            self._fields[field].add(text, source.index, source.citations)
+
+    def _remove(self, index: int) -> None:
+        source = self._sources.pop(index, None)
+        if source is None:
+            return
+        for field, text in self._texts(source):
+            self._fields[field].remove(text, index)
+
+    @staticmethod
+    def _texts(source: SuggestSource) -> Iterable[Tuple[str, str]]:
+        if source.title:
+            yield "title", " ".join(source.title.split())
+        for name in dict.fromkeys(split_authors(source.authors)):
+            yield "author", name
+        if source.journal and source.journal.strip():
+            yield "journal", source.journal.strip()
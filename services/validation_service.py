@@ -1,29 +1,90 @@
+import math
+from typing import TYPE_CHECKING, Dict, List
+
 from data.domain.article import Article
 
+if TYPE_CHECKING:
+    import pandas as pd
+
+MIN_YEAR = 0
+MAX_YEAR = 2025
+REQUIRED_TEXT_FIELDS = ("title", "authors", "journal", "abstract")
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value)) or str(value).strip() == ""
+
+
+def _as_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
 class ValidationService:
     def validate_article(self, article: Article) -> bool:
-        if article.title is None or article.title == "":
-            return False
-        
-        if article.authors is None or article.authors == "":
-            return False
-        
-        if article.journal is None or article.journal == "":
-            return False
-
-        if article.abstract is None or article.abstract == "":
-            return False
-
-        if article.year is None or article.year == "":
-            return False
-        
-        if article.citations is None or article.citations == "":
-            return False
-        
-        if article.year < 0 or article.year > 2025:
-            return False
-        
-        if article.citations < 0:
-            return False
-        
-        return True
\ No newline at end of file
+        return not self.article_errors(article)
+
+    def article_errors(self, article: Article) -> List[str]:
+        """The reasons `validate_batch` would give for this one article, in the same order"""
+        errors = [f"{field} is required" for field in REQUIRED_TEXT_FIELDS if _is_blank(getattr(article, field))]
+        for field in ("year", "citations"):
+            value = getattr(article, field)
+            if _is_blank(value):
+                errors.append(f"{field} is required")
+                continue
+            number = _as_number(value)
+            if number is None:
+                errors.append(f"{field} must be a number")
+                continue
+            if number % 1 != 0:
+                errors.append(f"{field} must be a whole number")
+            if field == "year" and not MIN_YEAR <= number <= MAX_YEAR:
+                errors.append(f"year must be between {MIN_YEAR} and {MAX_YEAR}")
+            if field == "citations" and number < 0:
+                errors.append("citations must not be negative")
+        return errors
+
+    def validate_batch(self, frame: "pd.DataFrame") -> Dict[int, List[str]]:
+        """Check a whole chunk of articles with column operations, applying the rules of `validate_article`.
+
+        Returns the reasons each invalid row was rejected, keyed by row
+        position; valid rows are left out. Missing columns count as empty.
+        Years and citations must be whole numbers; they are never truncated.
+        """
+        # pandas takes a quarter of a second to import and the API only needs it for batches.
+        import pandas as pd
+
+        checks = {}
+        for field in REQUIRED_TEXT_FIELDS:
+            values = frame[field] if field in frame else pd.Series(None, index=frame.index, dtype=object)
+            checks[f"{field} is required"] = values.isna() | (values.astype(str).str.strip() == "")
+
+        for field in ("year", "citations"):
+            values = frame[field] if field in frame else pd.Series(None, index=frame.index, dtype=object)
+            numbers = pd.to_numeric(values, errors="coerce")
+            checks[f"{field} is required"] = values.isna() | (values.astype(str).str.strip() == "")
+            checks[f"{field} must be a number"] = numbers.isna() & ~checks[f"{field} is required"]
+            checks[f"{field} must be a whole number"] = numbers.notna() & (numbers % 1 != 0)
+            if field == "year":
+                checks[f"year must be between {MIN_YEAR} and {MAX_YEAR}"] = (numbers < MIN_YEAR) | (numbers > MAX_YEAR)
+            else:
+                checks["citations must not be negative"] = numbers < 0
+
+        failures = pd.DataFrame(checks).to_numpy()
+        reasons = list(checks)
+        errors = {}
+        for position in failures.any(axis=1).nonzero()[0].tolist():
+            errors[position] = [reasons[check] for check in failures[position].nonzero()[0].tolist()]
+        return errors
+
+    def validate_articles(self, articles: List[Article]) -> Dict[int, List[str]]:
+        """`validate_batch` over domain articles, keyed by position in `articles`"""
+        import pandas as pd
+
+        frame = pd.DataFrame(
+            {field: [getattr(article, field) for article in articles] for field in REQUIRED_TEXT_FIELDS + ("year", "citations")}
+        )
+        return self.validate_batch(frame)
@@ -1,7 +1,33 @@
 import unittest
 from unittest.mock import Mock, patch
 from services.service import Service
+from services.abstracts_encoder import AbstractsEncoder
 from data.domain.article import Article, Coordinates
+from services.metrics_service import MetricsService
+from datalink.instrumentation import SlowQueryLog
+from services.profiling_service import ProfilingService
+from datalink.routing import ConsistencyToken, SessionRouter, current_consistency, format_lsn, parse_lsn, primary_reads
+from datalink.data_link import DataLink
+from services.map_tile_service import MapTileService, MapPoint
+from services.search_cache import SearchCache
+from services.suggest_service import SuggestService, SuggestSource
+from services.knn_service import EmbeddingIndex, KnnGraphBuilder, embedding_matrix, project_coordinates, stream_embedding_matrix
+from services.embedding_snapshot import EmbeddingSnapshot, write_snapshot
+from services.export_service import ExportService, parse_columns
+from services.validation_service import ValidationService
+from services.admission_control import AdmissionController, CostClass, TokenBucketLimiter
+from api.middleware import AdmissionControlMiddleware, MetricsMiddleware
+from services.preprocessing_pipeline import PreprocessingPipeline, VectorCache, clean_record, embedding_key, read_records
+import asyncio
+import threading
+import time
+import pandas as pd
+import glob
+import io
+import json
+import os
+import tempfile
+import numpy as np
 
 class TestService(unittest.TestCase):
     def setUp(self):
@@ -47,9 +73,86 @@ class TestService(unittest.TestCase):
         self.service.add_article(self.test_article)
     
         self.mock_repository.add_article.assert_called_once_with(self.test_article)
-        self.assertEqual(len(self.test_article.embeddings), 3)
+        self.assertEqual(self.test_article.enrichment_status, "pending")
+        self.assertEqual(self.test_article.embeddings, [])
         self.assertIsInstance(self.test_article.coordinates, Coordinates)
 
+    def test_apply_batch_only_sends_valid_items_to_repository(self):
+        invalid_article = self.test_article.model_copy(update={"title": ""})
+        saved_article = self.test_article.model_copy(update={"id": "1", "index": 1})
+        self.mock_repository.apply_batch.return_value = {
+            "creates": [{"status": "created", "article": saved_article}],
+            "updates": [],
+            "deletes": [{"status": "deleted", "id": "5"}]
+        }
+
+        result = self.service.apply_batch([invalid_article, self.test_article], [], [5], user_id=1)
+
+        self.mock_repository.apply_batch.assert_called_once_with([self.test_article], [], [5], 1)
+        self.assertEqual([item["status"] for item in result["creates"]], ["invalid", "created"])
+        self.assertEqual(result["deletes"], [{"status": "deleted", "id": "5"}])
+
+    def test_search_articles_uses_cache_until_next_write(self):
+        article = Article(authors="Author 1", title="Test Title", journal="Journal 1",
+                          abstract="Abstract 1", year=2024, citations=10,
+                          coordinates=Coordinates(x=0.1, y=0.2), index=1)
+        self.mock_repository.get_articles.return_value = [article]
+        self.mock_repository.get_articles_by_ids.return_value = [article]
+        self.mock_repository.get_change_version.return_value = 41
+
+        self.service.search_articles("test")
+        self.service.search_articles("TEST")
+        self.assertEqual(self.mock_repository.get_articles.call_count, 1)
+        self.mock_repository.get_articles_by_ids.assert_called_once_with([1])
+
+        # Any writer, in this process or another, moves the shared change log version.
+        self.mock_repository.get_change_version.return_value = 42
+        self.service.search_articles("test")
+        self.assertEqual(self.mock_repository.get_articles.call_count, 2)
+
+    def test_get_facets_restricts_to_search_results(self):
+        article = Article(authors="Author 1", title="Test Title", journal="Journal 1",
+                          abstract="Abstract 1", year=2024, citations=10,
+                          coordinates=Coordinates(x=0.1, y=0.2), index=3)
+        self.mock_repository.get_articles.return_value = [article]
+
+        self.service.get_facets()
+        self.service.get_facets("test", top_journals=5)
+
+        self.mock_repository.get_facets.assert_any_call(None, None, 10)
+        self.mock_repository.get_facets.assert_called_with([3], None, 5)
+
+    def test_update_related_articles_reads_only_changed_vectors(self):
+        self.mock_repository.get_change_version.return_value = 1
+        self.mock_repository.iter_embeddings.side_effect = lambda: iter([[(1, [1.0, 0.0])], [(2, [0.0, 1.0])]])
+        self.mock_repository.get_neighbor_floors.return_value = {1: (1, 0.0), 2: (1, 0.0)}
+        self.mock_repository.merge_neighbors.side_effect = lambda lists, candidates, merge: {
+            **lists, **{article_id: [entry] for article_id, entries in candidates.items() for entry in entries}
+        }
+        new_article = Article(authors="A", title="T", journal="J", abstract="x", year=2024, citations=0,
+                              coordinates=Coordinates(x=0.0, y=0.0), embeddings=[0.9, 0.1], index=3)
+        self.mock_repository.get_changes.return_value = {
+            "changes": [{"version": 2, "operation": "insert", "article_id": 3, "article": new_article}],
+            "next_since": 2,
+            "has_more": False
+        }
+
+        self.service.update_related_articles([3])
+        self.service.update_related_articles([3])
+
+        self.mock_repository.iter_embeddings.assert_called_once_with()
+        self.mock_repository.get_embeddings.assert_not_called()
+        lists, candidates, _ = self.mock_repository.merge_neighbors.call_args[0]
+        self.assertEqual(lists[3][0][0], 1)
+        self.assertIn(1, candidates)
+        self.assertEqual(self.service.embedding_index.version, 2)
+
+    def test_get_articles_in_bbox_rejects_inverted_box(self):
+        with self.assertRaises(ValueError):
+            self.service.get_articles_in_bbox(10, -10, 0, 5, limit=100)
+
+        self.mock_repository.get_articles_in_bbox.assert_not_called()
+
     def test_delete_article(self):
         self.service.delete_article("test-id")
         
@@ -71,5 +174,666 @@ class TestService(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].title, "Test Title")
 
+    def test_suggestions_follow_writes_from_other_processes(self):
+        self.mock_repository.get_change_version.return_value = 5
+        self.mock_repository.get_suggest_sources.return_value = [(1, "Neural Networks", "A. Smith", "Nature", 10)]
+        self.assertEqual([result["text"] for result in self.service.suggest("neu")], ["Neural Networks"])
+
+        self.mock_repository.get_change_version.return_value = 7
+        self.mock_repository.get_changes.return_value = {
+            "changes": [
+                {"version": 6, "operation": "insert", "article_id": 2, "article": Article(
+                    index=2, authors="C. Lee", title="Neutron Stars", journal="Science", abstract="Abstract",
+                    year=2020, citations=30, coordinates=Coordinates(x=0.0, y=0.0)
+                )},
+                {"version": 7, "operation": "delete", "article_id": 1, "article": None}
+            ],
+            "next_since": 7,
+            "has_more": False
+        }
+        self.service.suggestions.SYNC_SECONDS = 0
+
+        self.assertEqual([result["text"] for result in self.service.suggest("neu")], ["Neutron Stars"])
+        self.mock_repository.get_changes.assert_called_once_with(5, 500)
+        self.mock_repository.get_suggest_sources.assert_called_once()
+
+    def test_map_tiles_rebuild_after_a_bulk_import(self):
+        self.mock_repository.get_change_version.return_value = 10
+        self.mock_repository.get_map_points.return_value = [(1, 0.0, 0.0, 5, "Nature", "A")]
+        self.assertEqual(self.service.get_map_tile(0, 0, 0)["cells"][0]["count"], 1)
+
+        self.mock_repository.get_change_version.return_value = 11 + MapTileService.REPLAY_LIMIT
+        self.mock_repository.get_map_points.return_value = [(1, 0.0, 0.0, 5, "Nature", "A"), (2, 0.0, 0.0, 1, "Cell", "B")]
+        self.service.map_tiles.SYNC_SECONDS = 0
+
+        self.assertEqual(self.service.get_map_tile(0, 0, 0)["cells"][0]["count"], 2)
+        self.mock_repository.get_changes.assert_not_called()
+        self.assertEqual(self.service.map_tiles.version, 11 + MapTileService.REPLAY_LIMIT)
+
+class TestValidationService(unittest.TestCase):
+    def test_validate_batch_reports_every_reason_per_row(self):
+        frame = pd.DataFrame({
+            "title": ["Title", "", "Title", "Title"],
+            "authors": ["Author", "Author", None, "Author"],
+            "journal": ["Journal"] * 4,
+            "abstract": ["Abstract"] * 4,
+            "year": [2020, 2020, "soon", 3000],
+            "citations": [0, 5, 1, -1]
+        })
+
+        errors = ValidationService().validate_batch(frame)
+
+        self.assertEqual(errors, {
+            1: ["title is required"],
+            2: ["authors is required", "year must be a number"],
+            3: ["year must be between 0 and 2025", "citations must not be negative"]
+        })
+
+    def test_single_and_batch_validation_agree(self):
+        articles = [
+            Article(authors="Author", title=title, journal="Journal", abstract="Abstract", year=year, citations=citations,
+                    coordinates=Coordinates(x=0.0, y=0.0))
+            for title, year, citations in (("Title", 2020, 0), ("   ", 2020, 0), ("Title", 2026, 0), ("Title", -1, -1))
+        ]
+        service = ValidationService()
+
+        batch = service.validate_articles(articles)
+
+        self.assertEqual([service.article_errors(article) for article in articles], [batch.get(i, []) for i in range(4)])
+        self.assertEqual([service.validate_article(article) for article in articles], [True, False, False, False])
+
+    def test_validate_batch_rejects_fractional_years_and_citations(self):
+        frame = pd.DataFrame({
+            "title": ["Title"] * 3,
+            "authors": ["Author"] * 3,
+            "journal": ["Journal"] * 3,
+            "abstract": ["Abstract"] * 3,
+            "year": [2020, "2019.5", 2020.0],
+            "citations": [1.5, 2, "3"]
+        })
+
+        errors = ValidationService().validate_batch(frame)
+
+        self.assertEqual(errors, {
+            0: ["citations must be a whole number"],
+            1: ["year must be a whole number"]
+        })
+
+class TestMetricsService(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsService()
+
+    def test_render_counter_and_histogram(self):
+        self.metrics.observe_request("GET", "/article/{index}", 200, 0.02, query_count=2, query_duration=0.01)
+        self.metrics.observe_request("GET", "/article/{index}", 404, 0.2)
+
+        output = self.metrics.render()
+
+        self.assertIn('http_requests_total{method="GET",route="/article/{index}",status="200"} 1', output)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/article/{index}",le="0.025"} 1', output)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/article/{index}",le="+Inf"} 2', output)
+        self.assertIn('http_request_db_queries_sum{route="/article/{index}"} 2', output)
+
+    def test_gauges_are_evaluated_on_render(self):
+        connections = []
+        self.metrics.register_gauge("websocket_connections", lambda: len(connections))
+        connections.append(object())
+
+        self.assertIn("websocket_connections 1", self.metrics.render())
+
+class TestSlowQueryLog(unittest.TestCase):
+    def test_only_statements_above_threshold_are_kept(self):
+        slow_query_log = SlowQueryLog(threshold=0.1)
+
+        slow_query_log("SELECT 1", {}, 0.01)
+        slow_query_log("SELECT * FROM articles", {"year_1": 2024}, 0.25)
+
+        entries = slow_query_log.recent()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["statement"], "SELECT * FROM articles")
+        self.assertEqual(entries[0]["duration_ms"], 250.0)
+
+    def test_parameter_values_are_redacted(self):
+        slow_query_log = SlowQueryLog(threshold=0.1)
+
+        slow_query_log("SELECT * FROM users WHERE username = %(username_1)s", {"username_1": "alice"}, 0.25)
+
+        self.assertEqual(slow_query_log.recent()[0]["parameters"], "{'username_1': 'str'}")
+
+class TestProfilingService(unittest.TestCase):
+    def test_oldest_profiles_are_pruned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiling = ProfilingService(directory, max_files=2)
+            with patch("services.profiling_service.time.time", side_effect=[1.0, 2.0, 3.0]):
+                ids = [profiling.finish(profiling.start(), "GET", "/search") for _ in range(3)]
+
+            self.assertEqual(sorted(os.listdir(directory)), [f"{profile_id}.folded" for profile_id in ids[1:]])
+            self.assertIsNone(profiling.get_profile_path(ids[0]))
+
+class TestDataLink(unittest.TestCase):
+    def test_map_rows_matches_validated_article(self):
+        row = (7, 1, "Title", None, "Abstract", 2020, 5, "Author", "Journal", 1.5, -2.0, [0.1, 0.2], "ready")
+
+        mapped = DataLink()._map_rows([row])[0]
+
+        expected = Article(
+            id="7", index=7, title="Title", abstract="Abstract", authors="Author",
+            journal="Journal", year=2020, citations=5,
+            coordinates=Coordinates(x=1.5, y=-2.0), embeddings=[0.1, 0.2], user_id=1,
+            enrichment_status="ready"
+        )
+        self.assertEqual(mapped.model_dump(), expected.model_dump())
+
+    def test_update_re_enriches_only_when_the_abstract_changed(self):
+        data_link = DataLink()
+        stored = Mock(abstract="Abstract", enrichment_status="ready")
+        db = Mock()
+        db.query.return_value.filter.return_value.first.return_value = stored
+        edit = Article(index=7, title="Title", abstract="Abstract", authors="Author", journal="Journal", year=2020,
+                       citations=99, coordinates=Coordinates(x=1.0, y=2.0))
+
+        with patch.object(data_link, "enqueue_enrichment") as enqueue, patch.object(data_link, "record_changes"), \
+                patch.object(data_link, "_map_to_domain_article"):
+            data_link.update_article(db, edit)
+            self.assertEqual(stored.enrichment_status, "ready")
+            enqueue.assert_not_called()
+
+            data_link.update_article(db, edit.model_copy(update={"abstract": "A new abstract"}))
+            self.assertEqual(stored.enrichment_status, "pending")
+            enqueue.assert_called_once_with(db, [7])
+
+    def test_get_changes_keeps_latest_entry_per_article(self):
+        db = Mock()
+        db.query.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [
+            (4, 1, "insert"), (5, 2, "insert"), (6, 1, "update"), (7, 3, "delete")
+        ]
+        data_link = DataLink()
+        live = Article(title="Title", abstract="Abstract", authors="Author", journal="Journal",
+                       year=2020, citations=5, coordinates=Coordinates(x=0.0, y=0.0), index=1)
+
+        with patch.object(data_link, "get_articles_by_ids", return_value=[live]):
+            page = data_link.get_changes(db, since=3, limit=4)
+
+        self.assertEqual(
+            [(change["version"], change["article_id"], change["operation"]) for change in page["changes"]],
+            [(5, 2, "delete"), (6, 1, "update"), (7, 3, "delete")]
+        )
+        self.assertEqual(page["next_since"], 7)
+        self.assertTrue(page["has_more"])
+
+class TestSessionRouter(unittest.TestCase):
+    def setUp(self):
+        self.primary = Mock()
+        self.router = SessionRouter(self.primary, [Mock()])
+
+    def test_lsn_round_trip(self):
+        self.assertEqual(parse_lsn("1/A0"), (1 << 32) + 160)
+        self.assertEqual(format_lsn(parse_lsn("16/B374D848")), "16/B374D848")
+        self.assertIsNone(parse_lsn("garbage"))
+
+    def test_reads_without_token_go_to_replica(self):
+        db = self.router.read_session()
+
+        self.assertTrue(self.router.is_replica(db))
+        self.primary.assert_not_called()
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        token = current_consistency.set(ConsistencyToken(required=parse_lsn("0/100")))
+        try:
+            with patch.object(self.router, "_caught_up", return_value=False):
+                db = self.router.read_session()
+        finally:
+            current_consistency.reset(token)
+
+        self.assertIs(db, self.primary.return_value)
+        self.assertEqual(self.router.primary_fallbacks, 1)
+
+    def test_primary_reads_skip_replicas(self):
+        with primary_reads():
+            db = self.router.read_session()
+
+        self.assertIs(db, self.primary.return_value)
+        self.assertTrue(self.router.is_replica(self.router.read_session()))
+
+class TestAdmissionControl(unittest.TestCase):
+    def test_waiters_get_freed_slots_and_overflow_is_rejected(self):
+        async def scenario():
+            cost_class = CostClass("heavy", limit=1, queue_size=1, queue_timeout=1.0)
+            self.assertTrue(await cost_class.acquire())
+            waiting = asyncio.ensure_future(cost_class.acquire())
+            await asyncio.sleep(0)
+            rejected = await cost_class.acquire()
+            cost_class.release()
+            return rejected, await waiting, cost_class
+
+        rejected, admitted, cost_class = asyncio.run(scenario())
+
+        self.assertFalse(rejected)
+        self.assertTrue(admitted)
+        self.assertEqual((cost_class.active, cost_class.queue_depth, cost_class.rejections), (1, 0, 1))
+
+    def test_queue_timeout_rejects(self):
+        async def scenario():
+            cost_class = CostClass("heavy", limit=1, queue_size=4, queue_timeout=0.01)
+            await cost_class.acquire()
+            return await cost_class.acquire(), cost_class
+
+        admitted, cost_class = asyncio.run(scenario())
+
+        self.assertFalse(admitted)
+        self.assertEqual((cost_class.queue_depth, cost_class.timeouts), (0, 1))
+
+    def test_classify_by_path(self):
+        controller = AdmissionController.from_env()
+
+        self.assertEqual(controller.classify("/search").name, "heavy")
+        self.assertEqual(controller.classify("/article/3/related").name, "default")
+        self.assertIsNone(controller.classify("/health"))
+
+    def test_route_table(self):
+        controller = AdmissionController.from_env()
+        expected = [
+            ("GET", "/all_articles", "heavy"),
+            ("GET", "/export", "export"),
+            ("GET", "/article/3", "heavy"),
+            ("GET", "/article/3/similar", "default"),
+            ("POST", "/add_article", "heavy"),
+            ("PUT", "/articles/7", "heavy"),
+            ("DELETE", "/articles/7", "heavy"),
+            ("POST", "/articles/batch", "default"),
+            ("POST", "/token", "auth"),
+            ("POST", "/register", "auth"),
+            ("GET", "/suggest", "default"),
+        ]
+
+        for method, path, name in expected:
+            with self.subTest(method=method, path=path):
+                self.assertEqual(controller.classify(path, method).name, name)
+
+    def test_shed_requests_are_counted_under_their_cost_class(self):
+        heavy = CostClass("heavy", limit=1, queue_size=0, queue_timeout=0.01)
+        controller = AdmissionController([heavy], routes={"/search": "heavy"}, default="heavy")
+        metrics = Mock()
+        app = MetricsMiddleware(AdmissionControlMiddleware(Mock(), controller), metrics)
+        scope = {"type": "http", "method": "GET", "path": "/search", "headers": []}
+
+        async def scenario():
+            await heavy.acquire()
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await app(dict(scope), None, send)
+            return sent
+
+        sent = asyncio.run(scenario())
+
+        self.assertEqual(sent[0]["status"], 503)
+        method, route, status_code = metrics.observe_request.call_args[0][:3]
+        self.assertEqual((method, route, status_code), ("GET", "shed:heavy", 503))
+
+    def test_token_bucket_allows_burst_then_limits_per_user(self):
+        limiter = TokenBucketLimiter(rate=1.0, burst=2)
+
+        self.assertEqual([limiter.acquire("alice") for _ in range(2)], [0.0, 0.0])
+        self.assertGreater(limiter.acquire("alice"), 0)
+        self.assertEqual(limiter.acquire("bob"), 0.0)
+
+class TestMapTileService(unittest.TestCase):
+    def setUp(self):
+        self.map_tiles = MapTileService()
+        self.map_tiles.rebuild(lambda: [
+            MapPoint(1, -10.0, -10.0, 5, "Nature", "A"),
+            MapPoint(2, -9.0, -9.0, 50, "Science", "B"),
+            MapPoint(3, 10.0, 10.0, 1, "Nature", "C")
+        ])
+
+    def test_root_tile_aggregates_whole_corpus(self):
+        tile = self.map_tiles.get_tile(0, 0, 0)
+
+        self.assertEqual(sum(cell["count"] for cell in tile["cells"]), 3)
+
+    def test_removing_top_article_promotes_next_most_cited(self):
+        self.map_tiles.remove(2)
+        self.map_tiles.upsert(MapPoint(4, 10.0, 10.0, 7, "Cell", "D"))
+
+        cells = self.map_tiles.get_tile(1, 0, 0)["cells"] + self.map_tiles.get_tile(1, 1, 1)["cells"]
+        root = self.map_tiles._levels[0][(0, 0)]
+
+        self.assertEqual(sum(cell["count"] for cell in cells), 3)
+        self.assertEqual(root.top.index, 4)
+        self.assertEqual(root.journals.most_common(1)[0][0], "Nature")
+
+    def test_rejects_tiles_outside_zoom_level(self):
+        with self.assertRaises(ValueError):
+            self.map_tiles.get_tile(1, 2, 0)
+
+    def test_overlapping_rebuilds_wait_for_the_one_in_flight(self):
+        map_tiles = MapTileService()
+        loading, release, loads = threading.Event(), threading.Event(), []
+
+        def load_points():
+            loads.append(1)
+            loading.set()
+            release.wait(5)
+            return [MapPoint(1, 0.0, 0.0, 5, "Nature", "A")]
+
+        first = threading.Thread(target=map_tiles.rebuild, args=(load_points,))
+        first.start()
+        loading.wait(5)
+        second = threading.Thread(target=map_tiles.rebuild, args=(load_points,))
+        second.start()
+        second.join(0.1)
+        map_tiles.upsert(MapPoint(2, 1.0, 1.0, 1, "Cell", "B"))
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(sum(cell["count"] for cell in map_tiles.get_tile(0, 0, 0)["cells"]), 2)
+
+class TestSearchCache(unittest.TestCase):
+    def test_evicts_least_recently_used_entry(self):
+        cache = SearchCache(max_entries=2)
+        cache.put("a", 0, [1])
+        cache.put("b", 0, [2])
+        cache.get("a", 0)
+        cache.put("c", 0, [3])
+
+        self.assertEqual(cache.get("a", 0), [1])
+        self.assertIsNone(cache.get("b", 0))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_stale_version_is_a_miss_and_frees_memory(self):
+        cache = SearchCache()
+        cache.put("a", 0, [1, 2, 3])
+
+        self.assertIsNone(cache.get("a", 1))
+        self.assertEqual(cache.bytes, 0)
+        self.assertEqual(cache.stats()["hit_rate"], 0.0)
+
+    def test_entries_expire_after_ttl(self):
+        cache = SearchCache(ttl=0.0)
+        cache.put("a", 0, [1])
+
+        self.assertIsNone(cache.get("a", 0))
+
+class TestSuggestService(unittest.TestCase):
+    def setUp(self):
+        self.suggestions = SuggestService()
+        self.suggestions.rebuild(lambda: [
+            SuggestSource(1, "Neural Networks", "A. Smith, B. Jones", "Nature", 10),
+            SuggestSource(2, "Neutron Stars", "A. Smith", "Science", 30),
+            SuggestSource(3, "Quantum Computing", "C. Lee", "Nature", 5)
+        ])
+
+    def test_prefix_matches_are_ranked_by_citations(self):
+        results = self.suggestions.suggest("neu", "title", k=10)
+
+        self.assertEqual([result["text"] for result in results], ["Neutron Stars", "Neural Networks"])
+
+    def test_authors_are_deduplicated_across_articles(self):
+        results = self.suggestions.suggest("a. s", "author")
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["count"], 2)
+        self.assertEqual(results[0]["index"], 2)
+
+    def test_updates_and_deletes_are_reflected(self):
+        self.suggestions.suggest("n", "journal")
+        self.suggestions.remove(1)
+        self.suggestions.upsert(SuggestSource(3, "Quantum Computing", "C. Lee", "Nature Physics", 5))
+
+        self.assertEqual([result["text"] for result in self.suggestions.suggest("n", "journal")], ["Nature Physics"])
+        self.assertEqual(self.suggestions.suggest("neural", "title"), [])
+
+class TestKnnGraphBuilder(unittest.TestCase):
+    def test_blocked_build_finds_nearest_neighbours(self):
+        ids, matrix = embedding_matrix([
+            (1, [1.0, 0.0]),
+            (2, [0.9, 0.1]),
+            (3, [0.0, 1.0]),
+            (4, [0.1, 0.9]),
+            (5, [])
+        ])
+
+        neighbour_ids, scores = KnnGraphBuilder(k=1, block_size=2, workers=2).build(ids, matrix)
+
+        self.assertEqual(ids.tolist(), [1, 2, 3, 4])
+        self.assertEqual(neighbour_ids[:, 0].tolist(), [2, 1, 4, 3])
+        self.assertTrue((scores > 0.9).all())
+
+    def test_streamed_matrix_matches_the_one_built_from_a_list(self):
+        rows = [(1, [3.0, 4.0]), (2, []), (3, [1.0, 0.0, 0.0]), (4, [0.0, 2.0]), (5, [1.0, 1.0])]
+
+        ids, matrix = stream_embedding_matrix([rows[:2], rows[2:4], rows[4:]])
+        expected_ids, expected_matrix = embedding_matrix(rows)
+
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(matrix, expected_matrix)
+        self.assertEqual(matrix.dtype, np.float32)
+
+    def test_embedding_index_grows_and_removes_in_place(self):
+        ids, matrix = embedding_matrix([(1, [1.0, 0.0]), (2, [0.0, 1.0])])
+        index = EmbeddingIndex(ids, matrix, {1: (1, 0.5)}, version=3)
+
+        for article_id in range(3, 40):
+            index.upsert(article_id, [1.0, float(article_id)])
+        index.remove(1)
+        index.upsert(2, [3.0, 4.0])
+        index.upsert(5, [1.0, 2.0, 3.0])
+
+        self.assertEqual(index.size, 37)
+        self.assertNotIn(5, index.positions)
+        self.assertEqual(int(index.ids[index.positions[39]]), 39)
+        np.testing.assert_allclose(index.matrix[index.positions[2]], [0.6, 0.8])
+
+class TestAbstractsEncoder(unittest.TestCase):
+    def test_concurrent_first_use_loads_the_model_once(self):
+        loads = []
+
+        class SlowModel:
+            def __init__(self, name):
+                loads.append(name)
+                time.sleep(0.05)
+
+        encoder = AbstractsEncoder()
+        module = Mock(SentenceTransformer=SlowModel)
+        with patch.dict("sys.modules", {"sentence_transformers": module}):
+            threads = [threading.Thread(target=lambda: encoder.model) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(loads), 1)
+
+class TestProjectCoordinates(unittest.TestCase):
+    def test_new_embedding_lands_next_to_similar_articles(self):
+        reference_embeddings = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+        reference_coordinates = np.array([[10.0, 10.0], [12.0, 10.0], [-20.0, -20.0]])
+
+        coordinates = project_coordinates(np.array([[1.0, 0.05]]), reference_embeddings, reference_coordinates, k=2)
+
+        self.assertTrue(10.0 <= coordinates[0, 0] <= 12.0)
+        self.assertAlmostEqual(coordinates[0, 1], 10.0)
+
+    def test_empty_reference_gives_origin(self):
+        coordinates = project_coordinates(np.ones((2, 3)), np.empty((0, 3)), np.empty((0, 2)))
+
+        self.assertEqual(coordinates.tolist(), [[0.0, 0.0], [0.0, 0.0]])
+
+class TestEmbeddingSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "embeddings")
+        self.rows = [(1, [1.0, 0.0, 0.0]), (2, [0.9, 0.1, 0.0]), (3, [0.0, 1.0, 0.0]), (5, [0.0, 0.0, 1.0])]
+
+    def test_int8_snapshot_finds_nearest_article(self):
+        count = write_snapshot(self.path, [self.rows[:2], self.rows[2:]], "int8")
+        snapshot = EmbeddingSnapshot(self.path, block_size=2)
+
+        self.assertEqual(count, 4)
+        self.assertEqual(snapshot.vectors.dtype, np.int8)
+        self.assertIsNone(snapshot.position_of(4))
+        self.assertEqual([article_id for article_id, _ in snapshot.search([1.0, 0.0, 0.0], k=2, exclude_id=1)], [2, 3])
+
+    def test_rerank_uses_exact_embeddings(self):
+        write_snapshot(self.path, [self.rows], "float16")
+        snapshot = EmbeddingSnapshot(self.path)
+        exact = dict(self.rows)
+
+        results = snapshot.search([1.0, 0.0, 0.0], k=1, rerank=lambda ids: [(article_id, exact[article_id]) for article_id in ids])
+
+        self.assertEqual(results[0][0], 1)
+        self.assertAlmostEqual(results[0][1], 1.0, places=6)
+
+    def test_new_export_is_a_new_snapshot_and_old_readers_keep_theirs(self):
+        write_snapshot(self.path, [self.rows[:2]], "int8")
+        old = EmbeddingSnapshot(self.path)
+        write_snapshot(self.path, [self.rows], "int8")
+        new = EmbeddingSnapshot(self.path)
+        write_snapshot(self.path, [self.rows[:1]], "int8")
+
+        self.assertFalse(old.is_current())
+        self.assertEqual((len(old), len(new)), (2, 4))
+        self.assertEqual(old.search([1.0, 0.0, 0.0], k=1)[0][0], 1)
+        self.assertEqual(len(glob.glob(self.path + ".*")), 2)
+        with self.assertRaises(AttributeError):
+            new.ids = None
+
+    def test_first_export_is_picked_up_without_a_restart(self):
+        service = Service(Mock())
+        service.use_embedding_snapshot(self.path)
+        self.assertIsNone(service._current_embedding_snapshot())
+
+        write_snapshot(self.path, [self.rows], "int8")
+        service._snapshot_checked_at = 0.0
+
+        self.assertEqual(len(service._current_embedding_snapshot()), 4)
+
+class TestExportService(unittest.TestCase):
+    def setUp(self):
+        self.columns = ["index", "year", "embeddings"]
+        self.chunks = [[(1, 2020, [0.5, 1.0]), (2, 2021, [])], [(3, 2022, [1.5, 2.0])]]
+
+    def test_parse_columns_rejects_unknown_names(self):
+        self.assertEqual(parse_columns("year, title,year"), ["year", "title"])
+        with self.assertRaises(ValueError):
+            parse_columns("title,secret")
+
+    def test_ndjson_has_one_line_per_row(self):
+        data = b"".join(ExportService("ndjson", self.columns).stream(self.chunks))
+
+        rows = [json.loads(line) for line in data.decode().splitlines()]
+        self.assertEqual([row["index"] for row in rows], [1, 2, 3])
+
+    def test_parquet_writes_a_row_group_per_chunk_with_fixed_size_embeddings(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = b"".join(ExportService("parquet", self.columns, embedding_dimension=2).stream(self.chunks))
+        parquet_file = pq.ParquetFile(io.BytesIO(data))
+        table = parquet_file.read()
+
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(table.schema.field("embeddings").type, pa.list_(pa.float32(), 2))
+        self.assertEqual(table.column("embeddings").to_pylist(), [[0.5, 1.0], None, [1.5, 2.0]])
+
+    def test_columnar_exports_without_any_embeddings_have_a_null_column(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        chunks = [[(1, 2020, None), (2, 2021, None)]]
+        table = pq.read_table(io.BytesIO(b"".join(ExportService("parquet", self.columns).stream(chunks))))
+        arrow = pa.ipc.open_stream(b"".join(ExportService("arrow", self.columns).stream(chunks))).read_all()
+
+        for exported in (table, arrow):
+            self.assertEqual(exported.schema.field("embeddings").type, pa.list_(pa.float32()))
+            self.assertEqual(exported.column("embeddings").to_pylist(), [None, None])
+
+class TestPreprocessingPipeline(unittest.TestCase):
+    def test_clean_record_from_arxiv_metadata(self):
+        record = clean_record({
+            "id": "0704.0001",
+            "title": "Calculation of prompt diphoton production\n  cross sections",
+            "authors": "C. Bal\\'azs, E. L. Berger",
+            "journal-ref": "Phys.Rev.D76:013009,2007",
+            "abstract": "  A fully differential\ncalculation.  ",
+            "versions": [{"version": "v1", "created": "Mon, 2 Apr 2007 19:18:42 GMT"}],
+            "update_date": "2008-11-13"
+        })
+
+        self.assertEqual(record["title"], "Calculation of prompt diphoton production cross sections")
+        self.assertEqual(record["abstract"], "A fully differential calculation.")
+        self.assertEqual((record["journal"], record["year"], record["citations"]), ("Phys.Rev.D76:013009,2007", 2007, 0))
+
+    def test_vector_cache_persists_across_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            keys = [embedding_key("first"), embedding_key("second")]
+            VectorCache(directory).add(keys, np.array([[1, 2], [3, 4]]))
+            cache = VectorCache(directory)
+
+            self.assertEqual(len(cache), 2)
+            self.assertNotIn(embedding_key("third"), cache)
+            np.testing.assert_array_equal(cache.get_many(keys[::-1]), [[3, 4], [1, 2]])
+
+    def test_rerun_encodes_only_new_abstracts_and_places_them_on_the_old_layout(self):
+        encoded, layouts, logs = [], [], []
+
+        class StubEncoder:
+            def encode_batch(self, abstracts, batch_size=64):
+                encoded.append(list(abstracts))
+                return [[len(abstract), ord(abstract[0]), 1.0] for abstract in abstracts]
+
+            def get_layout(self, embeddings):
+                layouts.append(len(embeddings))
+                return np.asarray(embeddings)[:, :2]
+
+        def article(article_id, abstract):
+            return {"id": article_id, "title": "Title", "authors": "Author", "abstract": abstract, "year": 2020}
+
+        def run(records):
+            with open(source, "w") as file:
+                file.write("\n".join(json.dumps(record) for record in records))
+            del logs[:]
+            PreprocessingPipeline(work_dir, output_dir, shard_size=2, encoder_factory=StubEncoder, log=logs.append).run([source])
+            shards = sorted(glob.glob(os.path.join(output_dir, "articles-*.ndjson")))
+            return {record["id"]: record for record in read_records(shards)}
+
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "arxiv.jsonl")
+            work_dir, output_dir = os.path.join(directory, "work"), os.path.join(directory, "out")
+            records = [article("a", "alpha"), article("b", "beta"), article("c", "gamma rays")]
+
+            first = run(records)
+            self.assertEqual(encoded, [["alpha", "beta"], ["gamma rays"]])
+            self.assertEqual(layouts, [3])
+            self.assertEqual(len(glob.glob(os.path.join(output_dir, "articles-*.ndjson"))), 2)
+            self.assertEqual(first["c"]["coordinates"], {"x": 10.0, "y": float(ord("g"))})
+
+            self.assertEqual(run(records), first)
+            self.assertEqual(len(encoded), 2)
+            self.assertEqual(logs, [
+                "clean: unchanged input, using checkpoint",
+                "embed: unchanged records, using cached embeddings",
+                "layout: unchanged embeddings, using checkpoint",
+                "write: output is up to date"
+            ])
+
+            second = run([article("a", "alpha"), article("b", "beta decay"), article("c", "gamma rays"), article("d", "delta")])
+            self.assertEqual(encoded[2:], [["beta decay"], ["delta"]])
+            self.assertEqual(layouts, [3])
+            for article_id in ("a", "c"):
+                self.assertEqual(second[article_id]["coordinates"], first[article_id]["coordinates"])
+            expected = project_coordinates(
+                np.array([second["b"]["embedding"], second["d"]["embedding"]]),
+                np.array([first["a"]["embedding"], first["c"]["embedding"]]),
+                np.array([[first[article_id]["coordinates"][axis] for axis in "xy"] for article_id in "ac"])
+            )
+            np.testing.assert_allclose(
+                [[second[article_id]["coordinates"][axis] for axis in "xy"] for article_id in "bd"], expected
+            )
+
 if __name__ == '__main__':
     unittest.main()